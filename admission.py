@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+
+# ----------------------------------------------------------------------------#
+# Admission control.
+# ----------------------------------------------------------------------------#
+
+# Expensive endpoints are listed in ADMISSION_LIMITS with a concurrency cap,
+# a bounded wait queue and a per-client token bucket. A request that cannot
+# be admitted is turned away immediately with 429 (client over its rate) or
+# 503 (endpoint saturated), both with Retry-After, so cheap pages keep their
+# worker threads. Clients are told apart by request.remote_addr, which
+# create_app() takes from the PROXY_HOPS trusted proxies' X-Forwarded-For.
+
+
+class ConcurrencyLimit:
+    """At most `limit` requests in flight, at most `queue` more waiting."""
+
+    def __init__(self, limit, queue=0, timeout=0.0):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(limit)
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self._waiting >= self.queue:
+                return False
+            self._waiting += 1
+        try:
+            return self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+
+class TokenBuckets:
+    """One token bucket per client key, refilled at `rate` tokens/second."""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Returns 0 if a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def _rejected(status, retry_after):
+    message = 'Too Many Requests' if status == 429 else 'Service Unavailable'
+    return message, status, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+
+def init_app(app):
+    limits = {}
+    for endpoint, options in app.config.get('ADMISSION_LIMITS', {}).items():
+        concurrency = buckets = None
+        if options.get('concurrency'):
+            concurrency = ConcurrencyLimit(options['concurrency'], options.get('queue', 0),
+                                           options.get('timeout', 0.0))
+        if options.get('rate'):
+            buckets = TokenBuckets(options['rate'], options.get('burst', options['rate']))
+        limits[endpoint] = (concurrency, buckets, options.get('retry_after', 1))
+    app.extensions['admission'] = limits
+
+    @app.before_request
+    def admit():
+        if request.endpoint not in limits:
+            return None
+        concurrency, buckets, retry_after = limits[request.endpoint]
+        if buckets is not None:
+            wait = buckets.take(request.remote_addr)
+            if wait:
+                return _rejected(429, wait)
+        if concurrency is not None:
+            if not concurrency.acquire():
+                return _rejected(503, retry_after)
+            g.admission_slot = concurrency
+        return None
+
+    @app.teardown_request
+    def release(exc):
+        slot = g.pop('admission_slot', None)
+        if slot is not None:
+            slot.release()
@@ -0,0 +1,182 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, desc, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import Artist, ArtistMonthlyShows, GenreCityMonthlyShows, Show, Venue, VenueMonthlyShows
+from partitions import month_start
+
+# ----------------------------------------------------------------------------#
+# Analytics rollups.
+# ----------------------------------------------------------------------------#
+
+# The rollup tables are bumped in the same transaction as each new show
+# (record_show) and can be recomputed for a range of months from "Show" with
+# `flask analytics rebuild`, e.g. nightly, to pick up edits and deletes.
+# Reads never touch "Show". On PostgreSQL the rebuild is INSERT ... SELECT
+# with date_trunc and unnest; other databases have neither, so there it
+# streams the shows once and counts them in Python.
+
+cli = AppGroup('analytics', help='Maintain the analytics rollup tables.')
+
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _increment(model, key):
+    """Adds one to model.show_count for `key`, creating the row if needed."""
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    if dialect in _UPSERT_INSERTS:
+        stmt = _UPSERT_INSERTS[dialect](table).values(show_count=1, **key)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key),
+                                          set_={'show_count': table.c.show_count + 1})
+        db.session.execute(stmt)
+        return
+    match = [table.c[column] == value for column, value in key.items()]
+    bumped = db.session.execute(update(table).where(*match).values(show_count=table.c.show_count + 1))
+    if bumped.rowcount == 0:
+        db.session.execute(insert(table).values(show_count=1, **key))
+
+
+def record_show(start_time, venue, artist):
+    """Counts one new show; call before committing the Show itself."""
+    month = month_start(start_time)
+    _increment(VenueMonthlyShows, {'venue_id': venue.id, 'month': month})
+    _increment(ArtistMonthlyShows, {'artist_id': artist.id, 'month': month})
+    for genre in artist.genres or []:
+        _increment(GenreCityMonthlyShows, {'genre': genre, 'city': venue.city or '',
+                                           'state': venue.state or '', 'month': month})
+
+
+def rebuild(since, until):
+    """Recomputes the rollups for months in [since, until) from "Show"."""
+    for model in (VenueMonthlyShows, ArtistMonthlyShows, GenreCityMonthlyShows):
+        db.session.execute(delete(model).where(model.month >= since, model.month < until))
+    in_range = (Show.start_time >= since, Show.start_time < until)
+    if db.engine.dialect.name == 'postgresql':
+        _rebuild_in_sql(in_range)
+    else:
+        _rebuild_in_python(in_range)
+
+
+def _rebuild_in_sql(in_range):
+    month = func.date_trunc('month', Show.start_time).cast(db.Date)
+    db.session.execute(insert(VenueMonthlyShows).from_select(
+        ['venue_id', 'month', 'show_count'],
+        select(Show.venue_id, month, func.count()).where(Show.venue_id.isnot(None), *in_range)
+        .group_by(Show.venue_id, month)))
+    db.session.execute(insert(ArtistMonthlyShows).from_select(
+        ['artist_id', 'month', 'show_count'],
+        select(Show.artist_id, month, func.count()).where(Show.artist_id.isnot(None), *in_range)
+        .group_by(Show.artist_id, month)))
+
+    genre = func.unnest(Artist.genres).label('genre')
+    per_genre = (select(genre, func.coalesce(Venue.city, '').label('city'),
+                        func.coalesce(Venue.state, '').label('state'), month.label('month'))
+                 .select_from(Show).join(Artist, Artist.id == Show.artist_id)
+                 .join(Venue, Venue.id == Show.venue_id).where(*in_range).subquery())
+    db.session.execute(insert(GenreCityMonthlyShows).from_select(
+        ['genre', 'city', 'state', 'month', 'show_count'],
+        select(per_genre.c.genre, per_genre.c.city, per_genre.c.state, per_genre.c.month, func.count())
+        .group_by(per_genre.c.genre, per_genre.c.city, per_genre.c.state, per_genre.c.month)))
+
+
+def _rebuild_in_python(in_range):
+    venues, artists, genres = Counter(), Counter(), Counter()
+    rows = db.session.execute(
+        select(Show.start_time, Show.venue_id, Show.artist_id, Venue.city, Venue.state, Artist.genres)
+        .outerjoin(Venue, Venue.id == Show.venue_id).outerjoin(Artist, Artist.id == Show.artist_id)
+        .where(*in_range), execution_options={'stream_results': True})
+    for start_time, venue_id, artist_id, city, state, artist_genres in rows:
+        month = month_start(start_time)
+        if venue_id is not None:
+            venues[venue_id, month] += 1
+        if artist_id is not None:
+            artists[artist_id, month] += 1
+        if venue_id is not None and artist_id is not None:
+            for genre in artist_genres or []:
+                genres[genre, city or '', state or '', month] += 1
+
+    for model, columns, counts in (
+            (VenueMonthlyShows, ('venue_id', 'month'), venues),
+            (ArtistMonthlyShows, ('artist_id', 'month'), artists),
+            (GenreCityMonthlyShows, ('genre', 'city', 'state', 'month'), genres)):
+        if counts:
+            db.session.execute(insert(model), [dict(zip(columns, key), show_count=show_count)
+                                               for key, show_count in counts.items()])
+
+
+def shows_per_venue(since, limit=50):
+    """Monthly show counts of the venues with the most shows since `since`."""
+    top = (select(VenueMonthlyShows.venue_id).where(VenueMonthlyShows.month >= since)
+           .group_by(VenueMonthlyShows.venue_id)
+           .order_by(desc(func.sum(VenueMonthlyShows.show_count))).limit(limit).subquery())
+    rows = db.session.execute(
+        select(Venue.id, Venue.name, VenueMonthlyShows.month, VenueMonthlyShows.show_count)
+        .join(VenueMonthlyShows, VenueMonthlyShows.venue_id == Venue.id)
+        .where(Venue.id.in_(select(top.c.venue_id)), VenueMonthlyShows.month >= since)
+        .order_by(Venue.name, VenueMonthlyShows.month))
+    venues = {}
+    for id, name, month, show_count in rows:
+        venue = venues.setdefault(id, {'id': id, 'name': name, 'months': []})
+        venue['months'].append({'month': month.isoformat(), 'show_count': show_count})
+    return list(venues.values())
+
+
+def top_genres_by_city(since, per_city=5):
+    total = func.sum(GenreCityMonthlyShows.show_count).label('show_count')
+    rows = db.session.execute(
+        select(GenreCityMonthlyShows.city, GenreCityMonthlyShows.state, GenreCityMonthlyShows.genre, total)
+        .where(GenreCityMonthlyShows.month >= since)
+        .group_by(GenreCityMonthlyShows.city, GenreCityMonthlyShows.state, GenreCityMonthlyShows.genre)
+        .order_by(GenreCityMonthlyShows.state, GenreCityMonthlyShows.city, desc(total), GenreCityMonthlyShows.genre))
+    cities = {}
+    for city, state, genre, show_count in rows:
+        area = cities.setdefault((city, state), {'city': city, 'state': state, 'genres': []})
+        if len(area['genres']) < per_city:
+            area['genres'].append({'genre': genre, 'show_count': show_count})
+    return list(cities.values())
+
+
+def busiest_artists(since, limit=10):
+    total = func.sum(ArtistMonthlyShows.show_count).label('show_count')
+    rows = db.session.execute(
+        select(Artist.id, Artist.name, total)
+        .join(ArtistMonthlyShows, ArtistMonthlyShows.artist_id == Artist.id)
+        .where(ArtistMonthlyShows.month >= since)
+        .group_by(Artist.id, Artist.name).order_by(desc(total), Artist.name).limit(limit))
+    return [{'id': id, 'name': name, 'show_count': show_count} for id, name, show_count in rows]
+
+
+def summary(months=12):
+    since = month_start(datetime.now(), -(months - 1))
+    return {
+        'since': since.isoformat(),
+        'shows_per_venue': shows_per_venue(since),
+        'top_genres_by_city': top_genres_by_city(since),
+        'busiest_artists': busiest_artists(since),
+    }
+
+
+@cli.command('rebuild')
+@click.option('--back', default=2, show_default=True, help='Past months to recompute.')
+@click.option('--ahead', default=12, show_default=True, help='Future months to recompute.')
+@click.option('--all', 'everything', is_flag=True, help='Recompute every month up to --ahead.')
+def rebuild_command(back, ahead, everything):
+    """Recompute the rollups for a window of months from the Show table."""
+    until = month_start(datetime.now(), ahead + 1)
+    since = month_start(datetime.now(), -back)
+    if everything:
+        first = db.session.execute(select(func.min(Show.start_time))).scalar()
+        since = month_start(first) if first else since
+    rebuild(since, until)
+    db.session.commit()
+    click.echo(f'rebuilt rollups for {since.isoformat()} up to {until.isoformat()}')
@@ -0,0 +1,133 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+import config
+import read_models
+from app import create_app
+from extensions import db
+from models import Artist, Show, Venue
+
+# ----------------------------------------------------------------------------#
+# Read model benchmark: python bench_read_models.py [--rows 100000]
+# ----------------------------------------------------------------------------#
+
+# Seeds a throwaway SQLite database with `rows` artists and venues (and two
+# shows per venue), then times each listing/search page's data both ways:
+# hydrating ORM objects as the views used to, and through read_models.py.
+# Each run reports wall time and the tracemalloc peak of building the data.
+
+
+class BenchConfig:
+    pass
+
+
+def _config(uri):
+    settings = BenchConfig()
+    for key in dir(config):
+        if key.isupper():
+            setattr(settings, key, getattr(config, key))
+    settings.SQLALCHEMY_DATABASE_URI = uri
+    settings.SNAPSHOT_PATH = None
+    settings.LOG_FILE = None
+    settings.PROFILE_ENABLED = False
+    return settings
+
+
+def seed(rows):
+    db.create_all()
+    now = datetime.now()
+    artists = [{'id': id, 'name': f'Artist {id}', 'city': f'City {id % 50}', 'state': 'CA',
+                'genres': ['Jazz'], 'phone': '415-555-0100'} for id in range(1, rows + 1)]
+    venues = [{'id': id, 'name': f'Venue {id}', 'city': f'City {id % 50}', 'state': 'CA',
+               'address': f'{id} Main St', 'genres': ['Jazz']} for id in range(1, rows + 1)]
+    shows = [{'venue_id': id, 'artist_id': id, 'start_time': now + timedelta(days=days)}
+             for id in range(1, rows + 1) for days in (-7, 7)]
+    for model, values in ((Artist, artists), (Venue, venues), (Show, shows)):
+        db.session.execute(insert(model), values)
+    db.session.commit()
+
+
+# The view code these replaced, for comparison.
+
+def orm_artists():
+    return [{'id': artist.id, 'name': artist.name} for artist in Artist.query.all()]
+
+
+def orm_search_artists(term):
+    return [{'id': artist.id, 'name': artist.name}
+            for artist in Artist.query.filter(Artist.name.ilike(f'%{term}%')).all()]
+
+
+def orm_venues():
+    areas = {}
+    for venue in Venue.query.all():
+        row = {column.name: getattr(venue, column.name) for column in Venue.__table__.columns}
+        row['num_upcoming_shows'] = len(venue.upcoming_shows())
+        areas.setdefault((venue.state, venue.city), []).append(row)
+    return areas
+
+
+def measure(compute):
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = compute()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    db.session.remove()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time listing and search pages, ORM vs read models.')
+    parser.add_argument('--rows', type=int, default=100000, help='artists and venues to seed')
+    parser.add_argument('--venue-rows', type=int, default=2000,
+                        help='venues timed for the ORM venues listing, which queries once per venue')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(_config(f"sqlite:///{os.path.join(directory, 'bench.sqlite')}"))
+        with app.app_context():
+            seed(args.rows)
+            cases = [
+                ('artists', orm_artists, read_models.artist_names),
+                ('search artists "1"', lambda: orm_search_artists('1'),
+                 lambda: read_models.search_artist_names('1')),
+                ('venues (read model)', None, read_models.venue_areas),
+            ]
+            print(f'{args.rows} rows; seconds and peak MB')
+            for name, before, after in cases:
+                line = f'{name:24}'
+                if before is not None:
+                    seconds, peak = measure(before)
+                    line += f'  orm {seconds:7.3f} s {peak / 2 ** 20:7.1f} MB'
+                seconds, peak = measure(after)
+                line += f'  read model {seconds:7.3f} s {peak / 2 ** 20:7.1f} MB'
+                print(line)
+
+            # the ORM listing runs one upcoming_shows() query per venue, so compare on a slice
+            db.session.execute(Venue.__table__.delete().where(Venue.id > args.venue_rows))
+            db.session.execute(Show.__table__.delete().where(Show.venue_id > args.venue_rows))
+            db.session.commit()
+            orm_seconds, orm_peak = measure(orm_venues)
+            seconds, peak = measure(read_models.venue_areas)
+            print(f'{"venues":24}  orm {orm_seconds:7.3f} s {orm_peak / 2 ** 20:7.1f} MB'
+                  f'  read model {seconds:7.3f} s {peak / 2 ** 20:7.1f} MB  ({args.venue_rows} venues)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+# ----------------------------------------------------------------------------#
+# Startup benchmark: python bench_startup.py [--runs 5] [--top 15]
+# ----------------------------------------------------------------------------#
+
+# Each run starts a fresh interpreter that imports app and calls
+# create_app() the way a WSGI worker does (outside the flask CLI), and
+# reports the wall time of each step and the peak RSS they added. The last
+# run is made under `-X importtime` and the modules whose imports cost the
+# most are listed, so a new eager import shows up by name.
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def child():
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+
+    import config
+
+    class BenchConfig:
+        pass
+
+    settings = BenchConfig()
+    for key in dir(config):
+        if key.isupper():
+            setattr(settings, key, getattr(config, key))
+    settings.SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    settings.SNAPSHOT_PATH = None
+    settings.LOG_FILE = None
+    create_app(settings)
+    finished = time.perf_counter()
+    print(json.dumps({'import': imported - started, 'create_app': finished - imported,
+                      'rss_mb': _peak_rss_mb() - baseline, 'modules': len(sys.modules)}))
+
+
+def run(importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [__file__, '--child']
+    result = subprocess.run(command, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """The `top` modules by cumulative import time, with their nesting depth."""
+    rows = []
+    for self_us, cumulative_us, indent, name in IMPORTTIME.findall(stderr):
+        rows.append((int(cumulative_us), int(self_us), (len(indent) - 1) // 2, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time importing app and create_app() in fresh interpreters.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to average over')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    results = [run()[0] for _ in range(args.runs)]
+    last, stderr = run(importtime=True)
+    print(f'{args.runs} runs, medians')
+    for key, unit in (('import', 's'), ('create_app', 's'), ('rss_mb', 'MB')):
+        print(f'{key:12} {statistics.median(r[key] for r in results):8.3f} {unit}')
+    print(f'{"modules":12} {last["modules"]:8d}')
+    print(f'\nslowest imports (-X importtime, cumulative):')
+    for cumulative_us, self_us, depth, name in slowest_imports(stderr, args.top):
+        print(f'{cumulative_us / 1000:8.1f} ms  {"  " * depth}{name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, request
+
+import outbox
+
+# ----------------------------------------------------------------------------#
+# Request coalescing.
+# ----------------------------------------------------------------------------#
+
+# Views listed in PAGE_CACHE compute their template data through cached().
+# Within a process:
+#
+# - concurrent requests for the same data share one computation (single
+#   flight); the others wait for its result instead of querying as well;
+# - a result is fresh for `ttl` seconds, then served stale for up to `stale`
+#   more while one background refresh replaces it;
+# - a fresh result is refreshed early with a probability that grows as it
+#   nears `ttl`, scaled by how long it took to compute (XFetch), so hot keys
+#   are usually recomputed before they expire rather than at that instant.
+#
+# Every committed change to a venue, artist or show drops this process's
+# results when the process follows the outbox (see outbox.follower), which
+# the writing process does before its next request and the others within
+# OUTBOX_FOLLOW_INTERVAL. Cached values are shared between requests and must
+# not be mutated.
+#
+# Requests whose WSGI environ sets BYPASS always compute afresh and leave the
+# cache alone; prerender.render() uses it so the files it writes never hold a
+# page cached before the change being rendered.
+
+BYPASS = 'fyyur.coalesce.bypass'
+
+Entry = namedtuple('Entry', 'value computed_at cost')
+
+_executors = {}  # pid -> ThreadPoolExecutor, so a forked worker gets its own
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PageCache:
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> Entry, least recently used first
+        self._flights = {}             # key -> Flight in progress
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, ttl, stale=0, beta=1.0, wait=30, app=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry.computed_at
+                early = entry.cost * beta * -math.log(1.0 - random.random())
+                if age + early < ttl:
+                    return entry.value
+                if age < ttl + stale:
+                    if key not in self._flights and app is not None:
+                        flight = self._flights[key] = Flight()
+                        _executor().submit(self._refresh, app, key, flight, compute, self._generation)
+                    return entry.value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                generation = self._generation
+
+        if leader:
+            return self._run(key, flight, compute, generation)
+        if not flight.done.wait(wait):
+            return compute()  # the computation we joined is stuck; don't pile up behind it
+        if isinstance(flight.error, Exception):
+            raise flight.error
+        if flight.error is not None:
+            return compute()  # the leader was interrupted rather than failing
+        return flight.value
+
+    def _run(self, key, flight, compute, generation):
+        started = time.monotonic()
+        try:
+            flight.value = compute()
+            return flight.value
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # a result computed across an invalidate() may predate the write
+                if flight.error is None and generation == self._generation:
+                    self._entries[key] = Entry(flight.value, finished, finished - started)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+
+    def _refresh(self, app, key, flight, compute, generation):
+        try:
+            with app.app_context():
+                self._run(key, flight, compute, generation)
+        except Exception:
+            app.logger.exception('page refresh failed', extra={'key': repr(key)})
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _executor():
+    executor = _executors.get(os.getpid())
+    if executor is None:
+        executor = _executors[os.getpid()] = ThreadPoolExecutor(max_workers=2, thread_name_prefix='page-refresh')
+    return executor
+
+
+def _cache(app):
+    caches = app.extensions['coalesce']
+    cache = caches.get(os.getpid())
+    if cache is None:
+        cache = caches[os.getpid()] = PageCache(app.config.get('PAGE_CACHE_MAX_ENTRIES', 10000))
+    return cache
+
+
+def cached(compute, *key):
+    """compute(), shared per process for this endpoint and `key` as configured in PAGE_CACHE.
+
+    `compute` may run on a background thread, in an app context but
+    without the request, so it must not touch `request`, `flash` or `g`
+    state set up by the view.
+    """
+    app = current_app._get_current_object()
+    options = app.config.get('PAGE_CACHE', {}).get(request.endpoint)
+    if not options or 'coalesce' not in app.extensions or request.environ.get(BYPASS):
+        return compute()
+    return _cache(app).get((request.endpoint,) + key, compute, options['ttl'], options.get('stale', 0),
+                           options.get('beta', 1.0), options.get('wait', 30), app)
+
+
+def invalidate():
+    """Drops this process's cached results."""
+    app = current_app._get_current_object()
+    if 'coalesce' in app.extensions:
+        _cache(app).invalidate()
+
+
+@outbox.follower()
+def _follow(event):
+    invalidate()
+
+
+def init_app(app):
+    app.extensions['coalesce'] = {}  # pid -> PageCache
@@ -0,0 +1,293 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import hashlib
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from collections import defaultdict, namedtuple
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import null, select
+
+import outbox
+from extensions import db
+from models import Artist, Venue
+
+# ----------------------------------------------------------------------------#
+# Duplicate detection.
+# ----------------------------------------------------------------------------#
+
+# Venues and artists are compared on normalised fields: names become a set
+# of character trigrams of their significant words (so "The Musical Hop" and
+# "Musical Hop, The" are identical), phones their last ten digits, addresses
+# a lowercase form with common abbreviations.
+#
+# Names are summarised by a MinHash signature of BANDS * ROWS values, built
+# with one-permutation hashing (each trigram is hashed once and lands in one
+# bin) and cut into BANDS bands of ROWS. Two records share a band key with
+# high probability when the Jaccard similarity of their trigrams is above
+# ~(1/BANDS)**(1/ROWS), and
+# records that also share a phone or an address key always meet. Only
+# records sharing a key are scored, so a lookup touches a handful of
+# candidates instead of the whole catalog.
+#
+# A shared phone or address only counts for names that are already somewhat
+# alike (MIN_NAME_SIMILARITY): venues in one building or acts behind one
+# booking line are otherwise different records.
+#
+# Like the name index, the in-memory index is per process, built by
+# wsgi.preload() for the workers to inherit (or on first use elsewhere) and
+# kept current from the outbox (see outbox.follower).
+
+BANDS = 8
+ROWS = 4
+SIZE = BANDS * ROWS
+THRESHOLD = 0.8
+MIN_NAME_SIMILARITY = 0.3
+
+KINDS = {'venues': Venue, 'artists': Artist}
+
+_STOPWORDS = {'the', 'a', 'an', 'and', 'of'}
+_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+    'lane': 'ln', 'place': 'pl', 'court': 'ct', 'suite': 'ste', 'north': 'n',
+    'south': 's', 'east': 'e', 'west': 'w',
+}
+
+Record = namedtuple('Record', 'kind id name city state phone address')
+Features = namedtuple('Features', 'signature numbers phone address city')
+Match = namedtuple('Match', 'kind id name score')
+
+
+def _words(value):
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode().lower()
+    return re.sub(r'[^a-z0-9]+', ' ', value.replace('&', ' and ')).split()
+
+
+def normalize_name(name):
+    return ' '.join(sorted(word for word in _words(name) if word not in _STOPWORDS))
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalize_address(address, city=None):
+    words = [_ABBREVIATIONS.get(word, word) for word in _words(address)]
+    if not words:
+        return None
+    return ' '.join(words + _words(city))
+
+
+def _shingles(name):
+    shingles = set()
+    for word in normalize_name(name).split():
+        padded = f' {word} '
+        shingles.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return shingles
+
+
+@lru_cache(maxsize=65536)
+def _hash(shingle):
+    # a keyed hash rather than hash(), so signatures agree across processes
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+
+
+def signature(name):
+    bins = [None] * SIZE
+    for shingle in _shingles(name):
+        h = _hash(shingle)
+        b, value = h % SIZE, h // SIZE
+        if bins[b] is None or value < bins[b]:
+            bins[b] = value
+    if all(value is None for value in bins):
+        return None
+    # Short names leave bins empty; each borrows the next filled bin's value,
+    # tagged with the distance, so two names still agree bin by bin.
+    dense = [None] * SIZE
+    nearest, offset = None, 0
+    for i in range(2 * SIZE - 1, -1, -1):
+        if bins[i % SIZE] is None:
+            offset += 1
+        else:
+            nearest, offset = bins[i % SIZE], 0
+        if i < SIZE:
+            dense[i] = (nearest, offset)
+    return tuple(dense)
+
+
+def features(record):
+    numbers = frozenset(word for word in _words(record.name) if word.isdigit())
+    return Features(signature(record.name), numbers, normalize_phone(record.phone),
+                    normalize_address(record.address, record.city), ' '.join(_words(record.city)))
+
+
+def _keys(features):
+    keys = []
+    if features.signature:
+        keys += [('band', i, features.signature[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+    if features.phone:
+        keys.append(('phone', features.phone))
+    if features.address:
+        keys.append(('address', features.address))
+    return keys
+
+
+def score(a, b):
+    """Likelihood in [0, 1] that two records describe the same place or act."""
+    if a.signature and b.signature:
+        similarity = sum(x == y for x, y in zip(a.signature, b.signature)) / len(a.signature)
+    else:
+        similarity = 0.0
+    if similarity >= MIN_NAME_SIMILARITY:
+        if a.phone and a.phone == b.phone:
+            similarity = max(similarity, 0.5) + 0.3
+        if a.address and a.address == b.address:
+            similarity = max(similarity, 0.5) + 0.3
+    if a.numbers != b.numbers:
+        # trigrams barely see "Studio 54" vs "Studio 45" or "Venue 1" vs "Venue 3"
+        similarity -= 0.3
+    if a.city and b.city and a.city != b.city:
+        similarity -= 0.2
+    return max(0.0, min(similarity, 1.0))
+
+
+class DuplicateIndex:
+
+    def __init__(self):
+        self._buckets = defaultdict(set)  # (kind, key) -> {id}
+        self._records = {}                # (kind, id) -> (name, Features)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _insert(self, record, found=None):
+        found = found or features(record)
+        for key in _keys(found):
+            self._buckets[(record.kind, key)].add(record.id)
+        self._records[(record.kind, record.id)] = (record.name, found)
+
+    def _delete(self, kind, id):
+        entry = self._records.pop((kind, id), None)
+        if entry is None:
+            return
+        for key in _keys(entry[1]):
+            bucket = self._buckets.get((kind, key))
+            if bucket is not None:
+                bucket.discard(id)
+                if not bucket:
+                    del self._buckets[(kind, key)]
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            for record in catalog():
+                self._insert(record)
+            self._loaded = True
+
+    def put(self, record):
+        """Adds or updates one record; a no-op until the index is loaded."""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._delete(record.kind, record.id)
+            self._insert(record)
+
+    def remove(self, kind, id):
+        with self._lock:
+            if self._loaded:
+                self._delete(kind, id)
+
+    def matches(self, record, threshold=THRESHOLD):
+        """Indexed records likely to be duplicates of `record`, best first."""
+        if not self._loaded:
+            self.load()
+        return self._matches(record, features(record), threshold)
+
+    def _matches(self, record, found, threshold):
+        candidates = set()
+        for key in _keys(found):
+            candidates |= self._buckets.get((record.kind, key), set())
+        candidates.discard(record.id)
+        results = []
+        for id in candidates:
+            entry = self._records.get((record.kind, id))
+            if entry is None:
+                continue
+            likelihood = score(found, entry[1])
+            if likelihood >= threshold:
+                results.append(Match(record.kind, id, entry[0], round(likelihood, 2)))
+        return sorted(results, key=lambda match: -match.score)
+
+
+def record(kind, id=None, name=None, city=None, state=None, phone=None, address=None):
+    return Record(kind, id, name, city, state, phone, address)
+
+
+def catalog(kinds=KINDS, id=None):
+    for kind in kinds:
+        model = KINDS[kind]
+        address = model.address if hasattr(model, 'address') else null()  # artists have none
+        stmt = select(model.id, model.name, model.city, model.state, model.phone, address)
+        if id is not None:
+            stmt = stmt.where(model.id == id)
+        for row in db.session.execute(stmt):
+            yield Record(kind, *row)
+
+
+def clusters(kinds=KINDS, threshold=THRESHOLD):
+    """Groups of likely duplicates across the catalog, via a fresh blocking index."""
+    index = DuplicateIndex()
+    names, parent = {}, {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for current in catalog(kinds):
+        names[(current.kind, current.id)] = current.name
+        found = features(current)
+        for match in index._matches(current, found, threshold):
+            parent[find((current.kind, current.id))] = find((match.kind, match.id))
+        index._insert(current, found)
+
+    groups = defaultdict(list)
+    for node in parent:
+        groups[find(node)].append(node)
+    return [sorted((kind, id, names[(kind, id)]) for kind, id in members)
+            for members in groups.values() if len(members) > 1]
+
+
+index = DuplicateIndex()
+
+_ENTITY_KINDS = {model.__tablename__: kind for kind, model in KINDS.items()}
+
+
+@outbox.follower(*_ENTITY_KINDS)
+def _follow(event):
+    kind = _ENTITY_KINDS[event.entity]
+    if event.action == 'delete':
+        index.remove(kind, event.entity_id)
+    elif event.data.keys() & {'name', 'city', 'state', 'phone', 'address'}:
+        # an update only carries the changed columns; the record needs them all
+        for found in catalog((kind,), event.entity_id):
+            index.put(found)
+
+
+@click.command('dedupe')
+@click.option('--kind', type=click.Choice(sorted(KINDS)), multiple=True, help='Only check these (default: all).')
+@click.option('--threshold', default=THRESHOLD, show_default=True, help='Minimum match score.')
+@with_appcontext
+def dedupe_command(kind, threshold):
+    """List clusters of likely duplicate venues and artists."""
+    found = clusters(kind or KINDS, threshold)
+    for members in found:
+        click.echo(' | '.join(f'{kind} {id}: {name}' for kind, id, name in members))
+    click.echo(f'{len(found)} clusters of likely duplicates')
@@ -0,0 +1,262 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, text
+
+from extensions import db
+
+# ----------------------------------------------------------------------------#
+# Change events.
+# ----------------------------------------------------------------------------#
+
+# Write handlers call publish() inside their transaction; the deltas go out
+# only if it commits. /events streams them to subscribers as Server-Sent
+# Events, so clients can follow new shows and venue/artist changes instead of
+# polling /shows.
+#
+# On PostgreSQL the deltas travel as NOTIFY on EVENTS_CHANNEL, and each
+# process keeps one LISTEN connection whose thread fans them out to all of
+# its subscribers, so every worker sees writes made by every other one. The
+# "memory" backend delivers within the publishing process only and stands in
+# for PostgreSQL in tests and on SQLite.
+#
+# An idle subscriber costs a small bounded deque and a blocked thread, or a
+# greenlet when served by a gevent worker. EVENTS_MAX_SUBSCRIBERS caps them
+# per process: under gthread workers to half the worker's threads, so streams
+# never starve page requests.
+
+Event = namedtuple('Event', 'id topic action data')
+
+
+class Full(Exception):
+    """The process already serves EVENTS_MAX_SUBSCRIBERS subscribers."""
+
+
+def _encode(topic, action, data):
+    return json.dumps({'t': topic, 'a': action, 'd': data}, separators=(',', ':'), default=str)
+
+
+def _decode(payload):
+    message = json.loads(payload)
+    return message['t'], message['a'], message['d']
+
+
+def publish(topic, action, **data):
+    """Queues a delta on the current transaction, sent once it commits."""
+    db.session.info.setdefault('events', []).append((topic, action, data))
+
+
+class Subscription:
+    def __init__(self, topics, queue_size):
+        self.topics = topics
+        self.reset = False  # deltas were missed; the client should refetch
+        self._events = deque(maxlen=queue_size)
+        self._ready = threading.Condition()
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def put(self, event):
+        with self._ready:
+            if len(self._events) == self._events.maxlen:
+                # a client this far behind gets told to refetch instead
+                self.reset = True
+                self._events.clear()
+            self._events.append(event)
+            self._ready.notify()
+
+    def mark_reset(self):
+        with self._ready:
+            self.reset = True
+            self._events.clear()
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Waits up to `timeout` seconds; returns (reset, events)."""
+        with self._ready:
+            if not self._events and not self.reset:
+                self._ready.wait(timeout)
+            events, reset = list(self._events), self.reset
+            self._events.clear()
+            self.reset = False
+        return reset, events
+
+
+class Broker:
+    """Fans deltas out to this process's subscribers."""
+
+    def __init__(self, config):
+        self.max_subscribers = config['EVENTS_MAX_SUBSCRIBERS']
+        self.queue_size = config['EVENTS_QUEUE_SIZE']
+        self.epoch = uuid.uuid4().hex[:8]
+        self._issued = 0
+        self._backlog = deque(maxlen=config['EVENTS_BACKLOG'])
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics=None, last_event_id=None):
+        subscription = Subscription(topics, self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise Full()
+            if last_event_id:
+                self._replay(subscription, last_event_id)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _replay(self, subscription, last_event_id):
+        # Ids are only meaningful to the process that issued them, and the
+        # backlog only holds the last len(backlog) of them; a client that
+        # reconnects elsewhere, or too late, has to refetch.
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < self._issued - len(self._backlog):
+            subscription.reset = True
+            return
+        for e in list(self._backlog)[len(self._backlog) - (self._issued - int(sequence)):]:
+            if subscription.wants(e.topic):
+                subscription.put(e)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def dispatch(self, topic, action, data):
+        with self._lock:
+            self._issued += 1
+            e = Event(f'{self.epoch}-{self._issued}', topic, action, data)
+            self._backlog.append(e)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.wants(topic):
+                subscription.put(e)
+
+    def reset_all(self):
+        with self._lock:
+            self._backlog.clear()
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.mark_reset()
+
+    def before_commit(self, session, pending):
+        pass
+
+    def after_commit(self, pending):
+        pass
+
+
+class MemoryBroker(Broker):
+    def after_commit(self, pending):
+        for topic, action, data in pending:
+            # round-trip through JSON so subscribers see what NOTIFY would carry
+            self.dispatch(*_decode(_encode(topic, action, data)))
+
+
+class PostgresBroker(Broker):
+    def __init__(self, config, engine, logger):
+        super().__init__(config)
+        self.channel = config['EVENTS_CHANNEL']
+        self.engine = engine
+        self.logger = logger
+        threading.Thread(target=self._listen, name='events-listener', daemon=True).start()
+
+    def before_commit(self, session, pending):
+        # NOTIFY is transactional: it is delivered on commit, or not at all.
+        for topic, action, data in pending:
+            session.execute(text('SELECT pg_notify(:channel, :payload)'),
+                            {'channel': self.channel, 'payload': _encode(topic, action, data)})
+
+    def _listen(self):
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                connection.detach()  # a long-lived LISTEN connection stays out of the pool
+                dbapi = connection.connection
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f'LISTEN "{self.channel}"')
+                # anything sent while we were disconnected is lost
+                self.reset_all()
+                delay = 1
+                while True:
+                    if select.select([dbapi], [], [], 30)[0]:
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            self.dispatch(*_decode(dbapi.notifies.pop(0).payload))
+            except Exception:
+                self.logger.exception('events listener failed')
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def broker(app=None):
+    """This process's broker, created on first use so forked workers get their own."""
+    app = app or current_app._get_current_object()
+    brokers = app.extensions['events']
+    instance = brokers.get(os.getpid())
+    if instance is None:
+        engine = db.get_engine(app)
+        backend = app.config.get('EVENTS_BACKEND') or ('postgres' if engine.dialect.name == 'postgresql' else 'memory')
+        if backend == 'postgres':
+            instance = PostgresBroker(app.config, engine, app.logger)
+        else:
+            instance = MemoryBroker(app.config)
+        brokers[os.getpid()] = instance
+    return instance
+
+
+@event.listens_for(db.session, 'before_commit')
+def _send_pending(session):
+    pending = session.info.get('events')
+    if pending and has_app_context() and 'events' in current_app.extensions:
+        broker().before_commit(session, pending)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _deliver_pending(session):
+    pending = session.info.pop('events', None)
+    if pending and has_app_context() and 'events' in current_app.extensions:
+        broker().after_commit(pending)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _drop_pending(session, previous_transaction):
+    session.info.pop('events', None)
+
+
+def stream(broker, subscription, heartbeat):
+    """Yields the subscription as text/event-stream until the client goes away."""
+    try:
+        yield f'retry: {heartbeat * 1000}\n\n'
+        while True:
+            reset, events = subscription.get(heartbeat)
+            if reset:
+                yield 'event: reset\ndata: {}\n\n'
+            for e in events:
+                data = json.dumps(e.data, separators=(',', ':'), default=str)
+                yield f'id: {e.id}\nevent: {e.topic}.{e.action}\ndata: {data}\n\n'
+            if not reset and not events:
+                # keeps proxies from timing out idle streams and finds closed clients
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def init_app(app):
+    app.extensions['events'] = {}  # pid -> Broker
@@ -0,0 +1,14 @@
+# ----------------------------------------------------------------------------#
+# Extensions.
+# ----------------------------------------------------------------------------#
+
+# Extensions are created unbound here and attached to an application by
+# create_app() in app.py, so every module shares a single db/engine.
+# Flask-Migrate is left out on purpose: it pulls in alembic, which only the
+# `flask db` commands need (see create_app).
+
+from flask_moment import Moment
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+moment = Moment()
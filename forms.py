@@ -1,8 +1,10 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, ValidationError
-from wtforms.validators import DataRequired, AnyOf, URL, Length, InputRequired
-import phonenumbers
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, ValidationError
+from wtforms.validators import DataRequired, AnyOf, URL, Length, InputRequired, Optional
+from wtforms.widgets import HiddenInput
+
+import phones
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -127,17 +129,13 @@ class VenueForm(Form):
         'seeking_description'
     )
 
+    # version of the record the edit form was rendered from
+    version_id = IntegerField('version_id', validators=[Optional()], widget=HiddenInput())
+
     def validate_phone(self, field):
-        if len(field.data) < 10:
+        # one memoised parse; the handler stores the same E.164 form
+        if len(field.data) < 10 or phones.normalize(field.data) is None:
             raise ValidationError('Invalid phone number.')
-        try:
-            input_number = phonenumbers.parse(field.data)
-            if not phonenumbers.is_valid_number(input_number):
-                raise ValidationError('Invalid phone number.')
-        except:
-            input_number = phonenumbers.parse(f"+1{field.data}")
-            if not phonenumbers.is_valid_number(input_number):
-                raise ValidationError('Invalid phone number.')
 
 
 
@@ -250,14 +248,10 @@ class ArtistForm(Form):
             'seeking_description'
      )
 
+    # version of the record the edit form was rendered from
+    version_id = IntegerField('version_id', validators=[Optional()], widget=HiddenInput())
+
     def validate_phone(self, field):
-        if len(field.data) < 10:
+        # one memoised parse; the handler stores the same E.164 form
+        if len(field.data) < 10 or phones.normalize(field.data) is None:
             raise ValidationError('Invalid phone number.')
-        try:
-            input_number = phonenumbers.parse(field.data)
-            if not phonenumbers.is_valid_number(input_number):
-                raise ValidationError('Invalid phone number.')
-        except:
-            input_number = phonenumbers.parse(f"+1{field.data}")
-            if not phonenumbers.is_valid_number(input_number):
-                raise ValidationError('Invalid phone number.')
@@ -0,0 +1,63 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import gc
+import multiprocessing
+import os
+import resource
+
+# ----------------------------------------------------------------------------#
+# Gunicorn settings: gunicorn -c gunicorn.conf.py
+# ----------------------------------------------------------------------------#
+
+# The master imports wsgi.py (app, templates, forms) once and forks the
+# workers from it. Garbage collection stays off while it builds that state,
+# and gc.freeze() before each fork moves it out of the collector's reach, so
+# collections in a worker never write to the shared pages.
+gc.disable()
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# gthread by default. An /events subscriber occupies one of a worker's threads
+# (see EVENTS_MAX_SUBSCRIBERS), so /events is meant to be routed to the gevent
+# instance of gunicorn_events.conf.py instead.
+worker_class = os.environ.get('FYYUR_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('FYYUR_THREADS', 4))
+
+# Workers are replaced after max_requests (jittered so they do not all
+# restart at once) or once their peak RSS has grown by MAX_RSS_GROWTH_MB.
+max_requests = int(os.environ.get('FYYUR_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+MAX_RSS_GROWTH_MB = int(os.environ.get('FYYUR_MAX_RSS_GROWTH_MB', 200))
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def when_ready(server):
+    gc.freeze()
+    gc.enable()
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from extensions import db
+
+    # Never reuse a connection the master may have opened; the worker's
+    # engine starts with an empty pool.
+    db.get_engine(server.app.wsgi()).dispose(close=False)
+    gc.enable()
+    worker.baseline_rss_mb = _peak_rss_mb()
+
+
+def post_request(worker, req, environ, resp):
+    if _peak_rss_mb() - worker.baseline_rss_mb > MAX_RSS_GROWTH_MB:
+        worker.log.info('worker %s grew past %s MB, recycling', worker.pid, MAX_RSS_GROWTH_MB)
+        worker.alive = False
@@ -0,0 +1,30 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import os
+
+# ----------------------------------------------------------------------------#
+# Gunicorn settings for /events: gunicorn -c gunicorn_events.conf.py
+# ----------------------------------------------------------------------------#
+
+# The supported way to serve /events. The proxy routes only /events here
+# and everything else to the gthread instance of gunicorn.conf.py, where a
+# subscriber would hold one of a worker's few threads. Under gevent a
+# subscriber is a greenlet, so each worker holds EVENTS_MAX_SUBSCRIBERS (5000
+# by default, see config.py) idle streams.
+#
+# The app is not preloaded: gevent patches threading and sockets when a
+# worker starts, and locks or threads created in the master before that
+# would not cooperate with it.
+
+# read by config.py in the workers
+os.environ['FYYUR_WORKER_CLASS'] = 'gevent'
+
+wsgi_app = 'wsgi:app'
+preload_app = False
+bind = f"0.0.0.0:{os.environ.get('FYYUR_EVENTS_PORT', 5001)}"
+workers = int(os.environ.get('FYYUR_EVENTS_WORKERS', 2))
+worker_class = 'gevent'
+# room for every subscriber the app admits, plus the 503s beyond them
+worker_connections = int(os.environ.get('FYYUR_EVENTS_MAX_SUBSCRIBERS') or 5000) + 100
@@ -0,0 +1,279 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import warnings
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlparse
+
+from flask import current_app, url_for
+
+# ----------------------------------------------------------------------------#
+# Image thumbnails.
+# ----------------------------------------------------------------------------#
+
+# image_link values point at arbitrary full-size remote images. /img/... fetches
+# each source once, stores it content-addressed under IMAGE_CACHE_DIR and
+# derives fixed-size WebP/JPEG thumbnails from it:
+#
+#   sources/<sha256 of url>       -> sha256 of the fetched bytes
+#   originals/<content sha256>    -> the fetched bytes
+#   thumbs/<content sha256>-<size>.<webp|jpeg>
+#
+# Files are touched on every hit. Each process adds what it writes to the
+# size found by its last scan of the cache; once that passes
+# IMAGE_CACHE_MAX_BYTES it rescans and removes the least recently used files.
+# Concurrent requests for the same missing source or thumbnail wait for the
+# one fetching or rendering it. Resizing needs Pillow; without it the proxy
+# redirects to the source image.
+#
+# Sources are fetched with http.client rather than urlopen: each hop of a
+# redirect is checked like the first URL, and the connection goes to the
+# address that was checked instead of resolving the name again, so neither a
+# redirect nor a DNS answer that changes in between reaches an internal
+# address.
+
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+MAX_REDIRECTS = 3
+REDIRECTS = {301, 302, 303, 307, 308}
+
+_evict_lock = threading.Lock()
+_usage = {'bytes': None}  # cache size as of the last scan plus this process's writes since
+_usage_lock = threading.Lock()
+_key_locks = {}           # key -> [lock, requests holding or waiting for it]
+_key_locks_lock = threading.Lock()
+
+
+class ImageError(Exception):
+    """The source image could not be fetched or decoded."""
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def link_version(image_link):
+    return _sha256((image_link or '').encode())[:12]
+
+
+def thumbnail_url(kind, id, image_link, size):
+    """URL of a thumbnail; it changes whenever image_link changes."""
+    if not image_link:
+        return ''
+    return url_for('images.thumbnail', kind=kind, id=id, size=size, v=link_version(image_link))
+
+
+def _cache_path(*parts):
+    return os.path.join(current_app.config['IMAGE_CACHE_DIR'], *parts)
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return data
+
+
+@contextmanager
+def _single_flight(key):
+    """Held by one request per `key` in this process at a time."""
+    with _key_locks_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        replaced = os.path.getsize(path)
+    except FileNotFoundError:
+        replaced = 0
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    os.replace(tmp, path)
+    with _usage_lock:
+        if _usage['bytes'] is not None:
+            _usage['bytes'] += len(data) - replaced
+        scan = _usage['bytes'] is None or _usage['bytes'] > current_app.config['IMAGE_CACHE_MAX_BYTES']
+    if scan:
+        _evict()
+
+
+def _evict():
+    limit = current_app.config['IMAGE_CACHE_MAX_BYTES']
+    root = current_app.config['IMAGE_CACHE_DIR']
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        files = []
+        for folder in ('originals', 'thumbs', 'sources'):
+            try:
+                entries = os.scandir(os.path.join(root, folder))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total > limit:
+            # trim to 90% so the next scan is some writes away
+            for _, size, path in sorted(files):
+                if total <= limit * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with _usage_lock:
+            _usage['bytes'] = total
+    finally:
+        _evict_lock.release()
+
+
+def _connect(parsed, address, timeout):
+    """An HTTP(S) connection to `address` for `parsed`, whatever its host name resolves to by now."""
+    # only the fetch path needs these
+    import http.client
+    import ssl
+
+    https = parsed.scheme == 'https'
+    port = parsed.port or (443 if https else 80)
+    sock = socket.create_connection((address, port), timeout)
+    if https:
+        # the certificate is still checked against the host name
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+    connection = (http.client.HTTPSConnection if https else http.client.HTTPConnection)(
+        parsed.hostname, port, timeout=timeout)
+    connection.sock = sock
+    return connection
+
+
+def _check_origin(url):
+    """Returns (parsed url, address to connect to) for a URL that may be fetched."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageError(f'unsupported image url {url!r}')
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise ImageError(f'could not resolve {parsed.hostname}: {e}') from e
+    if not current_app.config.get('IMAGE_ALLOW_PRIVATE_ORIGINS'):
+        # image_link is user input: refuse to fetch from internal addresses
+        for info in addresses:
+            address = ipaddress.ip_address(info[4][0])
+            if not address.is_global:
+                raise ImageError(f'refusing to fetch image from non-public address {address}')
+    return parsed, addresses[0][4][0]
+
+
+def _fetch(url):
+    from http.client import HTTPException
+
+    limit = current_app.config['IMAGE_MAX_SOURCE_BYTES']
+    for _ in range(MAX_REDIRECTS + 1):
+        parsed, address = _check_origin(url)
+        path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        connection = None
+        try:
+            connection = _connect(parsed, address, current_app.config['IMAGE_FETCH_TIMEOUT'])
+            connection.request('GET', path, headers={'User-Agent': 'fyyur-image-proxy'})
+            response = connection.getresponse()
+            if response.status in REDIRECTS and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                raise ImageError(f'could not fetch {url}: HTTP {response.status}')
+            data = response.read(limit + 1)
+        except (OSError, HTTPException) as e:
+            raise ImageError(f'could not fetch {url}: {e}') from e
+        finally:
+            if connection is not None:
+                connection.close()
+        if len(data) > limit:
+            raise ImageError(f'{url} is larger than {limit} bytes')
+        return data
+    raise ImageError(f'more than {MAX_REDIRECTS} redirects fetching {url}')
+
+
+def original(url):
+    """Bytes of the source image, fetched at most once per cache lifetime."""
+    url_hash = _sha256(url.encode())
+    pointer = _cache_path('sources', url_hash)
+
+    def cached():
+        content_hash = _read(pointer)
+        if content_hash:
+            data = _read(_cache_path('originals', content_hash.decode()))
+            if data is not None:
+                return content_hash.decode(), data
+        return None
+
+    found = cached()
+    if found:
+        return found
+    with _single_flight(('source', url_hash)):
+        found = cached()  # fetched while this request waited
+        if found:
+            return found
+        data = _fetch(url)
+        content_hash = _sha256(data)
+        _write(_cache_path('originals', content_hash), data)
+        _write(pointer, content_hash.encode())
+    return content_hash, data
+
+
+def thumbnail(url, size, format):
+    """Returns (cache key, bytes) of the `size` thumbnail of `url` in `format`."""
+    content_hash, data = original(url)
+    key = f'{content_hash}-{size}.{format}'
+    path = _cache_path('thumbs', key)
+    thumb = _read(path)
+    if thumb is not None:
+        return key, thumb
+
+    from PIL import Image, UnidentifiedImageError
+
+    # Pillow only warns up to twice its limit; refuse anything past ours
+    Image.MAX_IMAGE_PIXELS = current_app.config['IMAGE_MAX_PIXELS']
+    with _single_flight(('thumb', key)):
+        thumb = _read(path)
+        if thumb is not None:
+            return key, thumb
+        width = current_app.config['IMAGE_SIZES'][size]
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', Image.DecompressionBombWarning)
+                image = Image.open(io.BytesIO(data))
+                image.thumbnail((width, width * 2))
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError,
+                Image.DecompressionBombWarning) as e:
+            raise ImageError(f'could not decode {url}: {e}') from e
+        if image.mode not in ('RGB', 'RGBA') or format == 'jpeg':
+            image = image.convert('RGBA' if format == 'webp' else 'RGB')
+        out = io.BytesIO()
+        image.save(out, format=format.upper(), quality=80)
+        _write(path, out.getvalue())
+    return key, out.getvalue()
@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+from flask import g, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import MANYTOONE
+from sqlalchemy.orm.util import identity_key
+
+from extensions import db
+
+# ----------------------------------------------------------------------------#
+# Batched lookups.
+# ----------------------------------------------------------------------------#
+
+# loader(Venue).load(id) returns the venue with that id, like
+# Venue.query.get(id), but every id that has been asked for or primed and
+# not yet fetched is resolved in the same `id IN (...)` query, and results
+# are memoised, so a loop over N shows costs one query per related model
+# instead of N.
+#
+# Loading any model instance primes the loaders of its many-to-one targets
+# with its foreign keys: after Show.query.all(), the first
+# loader(Venue).load(...) fetches the venues of all those shows at once.
+#
+# Loaders live in `g` and are dropped whenever the session's transaction
+# ends (commit, rollback, close), so they never hand out rows from an
+# earlier transaction.
+
+CHUNK = 500  # ids per IN (...), well under SQLite's bound parameter limit
+
+_MISSING = object()
+
+
+class Loader:
+
+    def __init__(self, model):
+        self.model = model
+        self._found = {}     # id -> instance, or None if there is no such row
+        self._pending = set()
+
+    def prime(self, ids):
+        """Queues `ids` to be fetched with the next load that needs a query."""
+        self._pending.update(id for id in ids if id is not None and id not in self._found)
+
+    def load(self, id):
+        if id is None:
+            return None
+        found = self._found.get(id, _MISSING)
+        if found is _MISSING:
+            self._pending.add(id)
+            self._dispatch()
+            found = self._found[id]
+        return found
+
+    def load_many(self, ids):
+        ids = list(ids)
+        self.prime(ids)
+        if self._pending:
+            self._dispatch()
+        return [self._found.get(id) for id in ids]
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, set()
+        # rows already in the session need no query at all
+        identity_map = db.session.identity_map
+        for id in list(pending):
+            instance = identity_map.get(identity_key(self.model, id))
+            if instance is not None:
+                self._found[id] = instance
+                pending.discard(id)
+        pending = sorted(pending)
+        for start in range(0, len(pending), CHUNK):
+            chunk = pending[start:start + CHUNK]
+            for instance in self.model.query.filter(self.model.id.in_(chunk)):
+                self._found[instance.id] = instance
+        for id in pending:
+            self._found.setdefault(id, None)
+
+
+def loader(model):
+    """The loader for `model` in the current request (a fresh one outside an app context)."""
+    if not has_app_context():
+        return Loader(model)
+    loaders = g.setdefault('_loaders', {})
+    if model not in loaders:
+        loaders[model] = Loader(model)
+    return loaders[model]
+
+
+_foreign_keys = {}  # mapper -> [(target model, local column attribute)]
+
+
+def _many_to_one(mapper):
+    found = _foreign_keys.get(mapper)
+    if found is None:
+        found = []
+        for relationship in mapper.relationships:
+            local = list(relationship.local_columns)
+            if relationship.direction is MANYTOONE and len(local) == 1:
+                found.append((relationship.mapper.class_, mapper.get_property_by_column(local[0]).key))
+        _foreign_keys[mapper] = found
+    return found
+
+
+@event.listens_for(db.Model, 'load', propagate=True)
+def _prime_related(instance, context):
+    if not has_app_context():
+        return
+    state = inspect(instance)
+    for target, attribute in _many_to_one(state.mapper):
+        value = state.dict.get(attribute)
+        if value is not None:
+            loader(target).prime((value,))
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget(session, transaction):
+    if transaction.parent is None and has_app_context():
+        g.pop('_loaders', None)
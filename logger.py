@@ -0,0 +1,188 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import current_app, g, has_request_context, request
+from flask.logging import default_handler
+
+import outbox
+from extensions import db
+
+# ----------------------------------------------------------------------------#
+# Logging.
+# ----------------------------------------------------------------------------#
+
+# Request threads only put records on an in-memory queue; a QueueListener
+# thread does the formatting and the stdout/file writes. There is one
+# listener per process: init_app() stops the previous one, so building
+# several apps (tests, pre-render workers) does not pile up threads.
+#
+# PUT /debug/log-level goes through broadcast_level(), which records the
+# change in the outbox; every web process applies it when it next follows
+# the outbox, within OUTBOX_FOLLOW_INTERVAL, and workers forked later replay
+# it from the position they inherit. Without the outbox (snapshot nodes) it
+# only reaches the process that served the request.
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'endpoint'}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request id and endpoint of the current request.
+
+    Attached to the QueueHandler so it runs on the request thread, while the
+    request context is still available.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.endpoint = request.endpoint
+        else:
+            record.request_id = None
+            record.endpoint = None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps only a sample of DEBUG records, with a per-endpoint rate."""
+
+    def __init__(self, default_rate=1.0, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG:
+            return True
+        rate = self.rates.get(getattr(record, 'endpoint', None), self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _QueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # Resolve the message and traceback text now, on the request thread,
+        # and drop args/exc_info so no live objects or frames are queued.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'endpoint': getattr(record, 'endpoint', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def _assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+
+def _echo_request_id(response):
+    response.headers.setdefault('X-Request-ID', g.get('request_id', ''))
+    return response
+
+
+def set_level(app, level, logger_name=None):
+    """Changes a log level at runtime; defaults to the application logger."""
+    logger = logging.getLogger(logger_name) if logger_name else app.logger
+    logger.setLevel(level)
+    return logging.getLevelName(logger.getEffectiveLevel())
+
+
+def broadcast_level(app, level, logger_name=None):
+    """Changes a log level in this process and, through the outbox, in every other one."""
+    level = set_level(app, level, logger_name)
+    if 'outbox' in app.extensions:
+        outbox.record('LogLevel', 'set', level=level, logger=logger_name)
+        db.session.commit()
+    return level
+
+
+@outbox.follower('LogLevel')
+def _follow(event):
+    set_level(current_app, event.data['level'], event.data.get('logger'))
+
+
+_listener = None  # this process's QueueListener
+
+
+def _restart_listener():
+    # A forked worker inherits the listener but not its thread.
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+atexit.register(_stop_listener)
+
+
+def init_app(app):
+    formatter = JSONFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if app.config.get('LOG_FILE'):
+        handlers.append(logging.FileHandler(app.config['LOG_FILE']))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(DebugSamplingFilter(
+        app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0),
+        app.config.get('LOG_DEBUG_SAMPLE_RATES'),
+    ))
+
+    global _listener
+    _stop_listener()
+    _listener = QueueListener(log_queue, *handlers)
+    _listener.start()
+    app.extensions['log_listener'] = _listener
+
+    # apps built in one process share their logger, and with it the handler
+    app.logger.removeHandler(default_handler)
+    for handler in [h for h in app.logger.handlers if isinstance(h, _QueueHandler)]:
+        app.logger.removeHandler(handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+    app.before_request(_assign_request_id)
+    app.after_request(_echo_request_id)
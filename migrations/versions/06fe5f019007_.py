@@ -0,0 +1,32 @@
+"""Add the BackfillCheckpoint table used by `flask backfill`.
+
+Revision ID: 06fe5f019007
+Revises: 435a129db8a3
+Create Date: 2026-10-19 21:02:17.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '06fe5f019007'
+down_revision = '435a129db8a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('BackfillCheckpoint',
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('max_id', sa.Integer(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('BackfillCheckpoint')
@@ -0,0 +1,35 @@
+"""Add the indexed E.164 phone_e164 columns to "Venue" and "Artist".
+
+Existing rows are filled in afterwards by `flask backfill run
+venue_phone_e164` and `artist_phone_e164`.
+
+Revision ID: 0d34f43f5ad7
+Revises: 9114cec2df3d
+Create Date: 2026-10-19 22:41:08.526113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import add_nullable_column, create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = '0d34f43f5ad7'
+down_revision = '9114cec2df3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_nullable_column('Venue', sa.Column('phone_e164', sa.String(length=20), nullable=True))
+    add_nullable_column('Artist', sa.Column('phone_e164', sa.String(length=20), nullable=True))
+    create_index_concurrently('ix_Venue_phone_e164', 'Venue', ['phone_e164'])
+    create_index_concurrently('ix_Artist_phone_e164', 'Artist', ['phone_e164'])
+
+
+def downgrade():
+    drop_index_concurrently('ix_Artist_phone_e164', 'Artist')
+    drop_index_concurrently('ix_Venue_phone_e164', 'Venue')
+    op.drop_column('Artist', 'phone_e164')
+    op.drop_column('Venue', 'phone_e164')
@@ -0,0 +1,74 @@
+"""Add monthly show rollup tables for analytics.
+
+Revision ID: 435a129db8a3
+Revises: 53cd44864ed4
+Create Date: 2026-10-19 20:31:07.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '435a129db8a3'
+down_revision = '53cd44864ed4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('VenueMonthlyShows',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('show_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'month')
+    )
+    op.create_table('ArtistMonthlyShows',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('show_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'month')
+    )
+    op.create_table('GenreCityMonthlyShows',
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('show_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('genre', 'city', 'state', 'month')
+    )
+    # Dashboard reads filter on month first.
+    op.create_index('ix_VenueMonthlyShows_month', 'VenueMonthlyShows', ['month'])
+    op.create_index('ix_ArtistMonthlyShows_month', 'ArtistMonthlyShows', ['month'])
+    op.create_index('ix_GenreCityMonthlyShows_month', 'GenreCityMonthlyShows', ['month'])
+    # Backfill from the existing shows. The SQL is PostgreSQL's; elsewhere run
+    # `flask analytics rebuild --all`, which does the same from the app.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+        INSERT INTO "VenueMonthlyShows" (venue_id, month, show_count)
+        SELECT venue_id, date_trunc('month', start_time)::date, count(*)
+        FROM "Show" WHERE venue_id IS NOT NULL GROUP BY 1, 2
+    ''')
+    op.execute('''
+        INSERT INTO "ArtistMonthlyShows" (artist_id, month, show_count)
+        SELECT artist_id, date_trunc('month', start_time)::date, count(*)
+        FROM "Show" WHERE artist_id IS NOT NULL GROUP BY 1, 2
+    ''')
+    op.execute('''
+        INSERT INTO "GenreCityMonthlyShows" (genre, city, state, month, show_count)
+        SELECT genre, coalesce(v.city, ''), coalesce(v.state, ''), date_trunc('month', s.start_time)::date, count(*)
+        FROM "Show" s
+        JOIN "Artist" a ON a.id = s.artist_id
+        JOIN "Venue" v ON v.id = s.venue_id
+        CROSS JOIN LATERAL unnest(a.genres) AS genre
+        GROUP BY 1, 2, 3, 4
+    ''')
+
+
+def downgrade():
+    op.drop_table('GenreCityMonthlyShows')
+    op.drop_table('ArtistMonthlyShows')
+    op.drop_table('VenueMonthlyShows')
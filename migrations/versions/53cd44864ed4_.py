@@ -0,0 +1,96 @@
+"""Range-partition Show by month on start_time.
+
+Revision ID: 53cd44864ed4
+Revises: a94c2cd26194
+Create Date: 2026-10-19 20:05:41.902113
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '53cd44864ed4'
+down_revision = 'a94c2cd26194'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created past the current month; later months are
+# created by `flask partitions maintain`.
+MONTHS_AHEAD = 3
+
+
+def _month(value, offset=0):
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    if bind.execute(sa.text('SELECT count(*) FROM "Show" WHERE start_time IS NULL')).scalar():
+        raise RuntimeError('"Show" has rows without start_time; they cannot be placed in a '
+                           'partition. Fix or delete them before upgrading.')
+
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+    # The partition key has to be part of the primary key.
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time timestamp without time zone NOT NULL,
+            venue_id integer REFERENCES "Venue" (id),
+            artist_id integer REFERENCES "Artist" (id),
+            CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    first = bind.execute(sa.text('SELECT min(start_time) FROM "Show_unpartitioned"')).scalar()
+    month = _month(first or datetime.now())
+    last = _month(datetime.now(), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f'CREATE TABLE "Show_p{month.year:04d}_{month.month:02d}" PARTITION OF "Show" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month(month, 1).isoformat()}')"
+        )
+        month = _month(month, 1)
+
+    op.execute('INSERT INTO "Show" (id, start_time, venue_id, artist_id) '
+               'SELECT id, start_time, venue_id, artist_id FROM "Show_unpartitioned"')
+    op.execute('DROP TABLE "Show_unpartitioned"')
+
+    # Created on the parent, so every current and future partition gets them.
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_partitioned_pkey"')
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time timestamp without time zone,
+            venue_id integer REFERENCES "Venue" (id),
+            artist_id integer REFERENCES "Artist" (id),
+            CONSTRAINT "Show_pkey" PRIMARY KEY (id)
+        )
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('INSERT INTO "Show" (id, start_time, venue_id, artist_id) '
+               'SELECT id, start_time, venue_id, artist_id FROM "Show_partitioned"')
+    op.execute('DROP TABLE "Show_partitioned"')
+
+    # dropped with the partitioned table; the model still declares them
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
@@ -0,0 +1,39 @@
+"""Add the transactional outbox tables.
+
+Revision ID: 9114cec2df3d
+Revises: 06fe5f019007
+Create Date: 2026-10-19 21:24:40.117385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9114cec2df3d'
+down_revision = '06fe5f019007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('OutboxEvent',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('OutboxConsumer',
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('OutboxConsumer')
+    op.drop_table('OutboxEvent')
@@ -0,0 +1,26 @@
+"""Add version_id to Venue and Artist for optimistic concurrency control.
+
+Revision ID: a94c2cd26194
+Revises: 070c1fc49b25
+Create Date: 2026-10-19 19:50:12.418306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a94c2cd26194'
+down_revision = '070c1fc49b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Artist', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'version_id')
+    op.drop_column('Venue', 'version_id')
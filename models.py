@@ -2,31 +2,33 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import logging
-from logging import Formatter, FileHandler
-from typing import List
+from datetime import datetime
 
-import babel
-import dateutil.parser
-from flask import Flask, render_template, request, flash, redirect, url_for
-from flask_migrate import Migrate
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert, update
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.types import TypeDecorator
 
-from forms import *
+from extensions import db
+from loaders import loader
 
 # ----------------------------------------------------------------------------#
-# App Config
+# Portable types.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+class StringArray(TypeDecorator):
+    """A list of strings: a native text[] on PostgreSQL, a JSON array elsewhere.
 
+    Python code always sees a list, so the same models work against
+    PostgreSQL and against a SQLite snapshot (see snapshot.py).
+    """
 
-# TODO: connect to a local postgresql database
+    impl = db.JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(db.ARRAY(db.String))
+        return dialect.type_descriptor(db.JSON())
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -41,38 +43,25 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    # `phone` in E.164, set on write (see phones.py); what phone lookups use
+    phone_e164 = db.Column(db.String(20), index=True)
+    genres = db.Column(StringArray)
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
     shows = db.relationship("Show")
 
-    def to_json(self):
-        return {
-
-            "id": self.id,
-            "name": self.name,
-            "city": self.city,
-            "state": self.state,
-            "address": self.address,
-            "phone": self.phone,
-            "genres": self.genres,
-            "image_link": self.image_link,
-            "website_link": self.website_link,
-            "facebook_link": self.facebook_link,
-            "seeking_talent": self.seeking_talent,
-            "seeking_description": self.seeking_description,
-        }
+    __mapper_args__ = {'version_id_col': version_id}
 
+    # Both filter on start_time so PostgreSQL only scans the matching Show partitions.
     def past_shows(self):
-        today = datetime.now()
-        return Show.query.join(Venue).filter(Show.venue_id == self.id).filter(Show.start_time < today).all()
+        return Show.query.filter(Show.venue_id == self.id).filter(~Show.is_upcoming()).all()
 
     def upcoming_shows(self):
-        today = datetime.now()
-        return Show.query.join(Venue).filter(Show.venue_id == self.id).filter(Show.start_time > today).all()
+        return Show.query.filter(Show.venue_id == self.id).filter(Show.is_upcoming()).all()
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -85,14 +74,24 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    phone_e164 = db.Column(db.String(20), index=True)
+    genres = db.Column(StringArray)
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
     shows = db.relationship('Show', lazy=True)
 
+    __mapper_args__ = {'version_id_col': version_id}
+
+    def past_shows(self):
+        return Show.query.filter(Show.artist_id == self.id).filter(~Show.is_upcoming()).all()
+
+    def upcoming_shows(self):
+        return Show.query.filter(Show.artist_id == self.id).filter(Show.is_upcoming()).all()
+
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 
@@ -101,8 +100,10 @@ class Artist(db.Model):
 class Show(db.Model):
     __tablename__ = 'Show'
 
+    # On PostgreSQL the table is partitioned by month on start_time and its
+    # primary key is (id, start_time); id alone is still unique.
     id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime)
+    start_time = db.Column(db.DateTime, nullable=False)
 
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"))
     venue = db.relationship("Venue", backref="venue_shows")
@@ -110,10 +111,132 @@ class Show(db.Model):
     artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"))
     artist = db.relationship("Artist", backref="artist_shows")
 
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    @classmethod
+    def is_upcoming(cls, now=None):
+        """The one definition of an upcoming show; ~Show.is_upcoming() is a past one."""
+        return cls.start_time >= (now or datetime.now())
+
     def to_json(self):
+        # batched with the artists of the other shows loaded in this request
+        artist = loader(Artist).load(self.artist_id)
         return {
-            "artist_id": self.artist.id,
-            "artist_name": self.artist.name,
-            "artist_image_link": self.artist.image_link,
+            "artist_id": artist.id,
+            "artist_name": artist.name,
+            "artist_image_link": artist.image_link,
             "start_time": self.start_time.strftime("%m/%d/%Y, %H:%M:%S")
         }
+
+
+# ----------------------------------------------------------------------------#
+# Analytics rollups.
+# ----------------------------------------------------------------------------#
+
+# Show counts pre-aggregated per month (first day of the month), maintained
+# by analytics.py. The /analytics views read only these tables.
+
+class VenueMonthlyShows(db.Model):
+    __tablename__ = 'VenueMonthlyShows'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id", ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArtistMonthlyShows(db.Model):
+    __tablename__ = 'ArtistMonthlyShows'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id", ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class GenreCityMonthlyShows(db.Model):
+    __tablename__ = 'GenreCityMonthlyShows'
+
+    # genre of the performing artist, city/state of the venue
+    genre = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ----------------------------------------------------------------------------#
+# Online migrations.
+# ----------------------------------------------------------------------------#
+
+# Progress of each batched backfill run by `flask backfill run` (see
+# online_migrations.py), committed with every batch so a run can resume.
+
+class BackfillCheckpoint(db.Model):
+    __tablename__ = 'BackfillCheckpoint'
+
+    name = db.Column(db.String(120), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    # highest id when the run started; rows written later get the new value from the app
+    max_id = db.Column(db.Integer, nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
+# ----------------------------------------------------------------------------#
+# Outbox.
+# ----------------------------------------------------------------------------#
+
+# One row per insert/update/delete of a Venue, Artist or Show, written in the
+# same transaction as the change (see outbox.py) and delivered in id order to
+# the registered handlers by `flask outbox consume`.
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'OutboxEvent'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)
+    # column values of an inserted/deleted row, or the changed columns of an update
+    data = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class OutboxConsumer(db.Model):
+    __tablename__ = 'OutboxConsumer'
+
+    name = db.Column(db.String(120), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ----------------------------------------------------------------------------#
+# Versioned updates.
+# ----------------------------------------------------------------------------#
+
+def update_versioned(model, id, version_id, values):
+    """Applies `values` to one row in a single UPDATE guarded by its version.
+
+    Issues UPDATE ... SET <values>, version_id = version_id + 1
+    WHERE id = :id AND version_id = :version_id without loading the row
+    first. Returns the new version; raises StaleDataError if the row was
+    changed by someone else since `version_id` was read, and returns None
+    if the row does not exist.
+    """
+    stmt = (update(model)
+            .where(model.id == id, model.version_id == version_id)
+            .values(version_id=model.version_id + 1, **values)
+            .execution_options(synchronize_session=False))
+    if db.session.execute(stmt).rowcount == 1:
+        # bulk UPDATEs skip the flush hooks in outbox.py; record the change here
+        db.session.execute(insert(OutboxEvent).values(
+            entity=model.__tablename__, entity_id=id, action='update',
+            data=dict(values, version_id=version_id + 1), created_at=datetime.utcnow()))
+        db.session.info['outbox'] = True  # see outbox._committed
+        return version_id + 1
+    if db.session.query(model.id).filter(model.id == id).first() is None:
+        return None
+    raise StaleDataError(f'{model.__tablename__} {id} was modified by another user (expected version {version_id}).')
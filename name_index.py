@@ -0,0 +1,122 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import bisect
+import threading
+
+from sqlalchemy import select
+
+import outbox
+from extensions import db
+from models import Artist, Venue
+
+# ----------------------------------------------------------------------------#
+# Name index.
+# ----------------------------------------------------------------------------#
+
+# In-memory prefix index over venue and artist names for autocomplete. Each
+# word position of a name is a key ("the musical hop", "musical hop", "hop"),
+# kept in one sorted list so a prefix lookup is a bisect plus a short scan.
+# The index is per process. wsgi.py builds it at startup, before gunicorn
+# forks the workers (elsewhere it is loaded on first use), and every process
+# then keeps it current from the outbox (see outbox.follower). Writers
+# replace the list rather than change it in place, so a search works on the
+# list it read under the lock while a put() builds the next one.
+
+KINDS = {'venues': Venue, 'artists': Artist}
+
+
+def _keys(name):
+    words = (name or '').lower().split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class NameIndex:
+
+    def __init__(self):
+        self._entries = []  # sorted (key, kind, id, name)
+        self._names = {}    # (kind, id) -> name currently indexed
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _insert(self, entries, kind, id, name):
+        for key in _keys(name):
+            bisect.insort(entries, (key, kind, id, name))
+        self._names[(kind, id)] = name
+
+    def _delete(self, entries, kind, id):
+        name = self._names.pop((kind, id), None)
+        if name is None:
+            return
+        for key in _keys(name):
+            i = bisect.bisect_left(entries, (key, kind, id, name))
+            if i < len(entries) and entries[i] == (key, kind, id, name):
+                del entries[i]
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            entries = []
+            for kind, model in KINDS.items():
+                for id, name in db.session.execute(select(model.id, model.name)):
+                    entries.extend((key, kind, id, name) for key in _keys(name))
+                    self._names[(kind, id)] = name
+            entries.sort()
+            self._entries = entries
+            self._loaded = True
+
+    def put(self, kind, id, name):
+        """Adds or renames one entry; a no-op until the index is loaded."""
+        with self._lock:
+            if not self._loaded:
+                return
+            entries = list(self._entries)
+            self._delete(entries, kind, id)
+            self._insert(entries, kind, id, name)
+            self._entries = entries
+
+    def remove(self, kind, id):
+        with self._lock:
+            if self._loaded:
+                entries = list(self._entries)
+                self._delete(entries, kind, id)
+                self._entries = entries
+
+    def search(self, prefix, limit=10):
+        """Returns {kind: [{'id', 'name'}, ...]} for names with a word starting with prefix."""
+        if not self._loaded:
+            self.load()
+        prefix = ' '.join(prefix.lower().split())
+        results = {kind: [] for kind in KINDS}
+        if not prefix:
+            return results
+        with self._lock:
+            entries = self._entries  # never modified once published
+        seen = set()
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix):
+            key, kind, id, name = entries[i]
+            i += 1
+            if (kind, id) in seen or len(results[kind]) >= limit:
+                continue
+            seen.add((kind, id))
+            results[kind].append({'id': id, 'name': name})
+            if all(len(found) >= limit for found in results.values()):
+                break
+        return results
+
+
+index = NameIndex()
+
+_ENTITY_KINDS = {model.__tablename__: kind for kind, model in KINDS.items()}
+
+
+@outbox.follower(*_ENTITY_KINDS)
+def _follow(event):
+    kind = _ENTITY_KINDS[event.entity]
+    if event.action == 'delete':
+        index.remove(kind, event.entity_id)
+    elif 'name' in event.data:
+        index.put(kind, event.entity_id, event.data['name'])
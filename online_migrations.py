@@ -0,0 +1,274 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from alembic import op
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select, text, update
+
+from extensions import db
+from models import BackfillCheckpoint
+
+# ----------------------------------------------------------------------------#
+# Online schema changes.
+# ----------------------------------------------------------------------------#
+
+# Helpers for Alembic revisions that must run against a live, populated
+# database without blocking "Show", "Venue" or "Artist". A change ships in
+# steps, each deployed on its own:
+#
+#   1. a revision adds the column as nullable (add_nullable_column) and the
+#      app starts writing it;
+#   2. `flask backfill run <name>` fills in the existing rows in small
+#      primary-key-range batches, resumable from its checkpoint;
+#   3. a revision builds indexes (create_index_concurrently) and tightens
+#      constraints (set_not_null, add_foreign_key) without long locks.
+#
+# For example, a revision for step 3:
+#
+#   from online_migrations import create_index_concurrently, set_not_null
+#
+#   def upgrade():
+#       create_index_concurrently('ix_Venue_slug', 'Venue', ['slug'], unique=True)
+#       set_not_null('Venue', 'slug')
+#
+# Every ALTER that needs an ACCESS EXCLUSIVE lock runs with a short
+# lock_timeout, so a long-running query makes the migration fail (retry it
+# later) instead of queueing all traffic behind it. On other databases the
+# helpers fall back to the plain operations.
+
+LOCK_TIMEOUT = '5s'
+
+cli = AppGroup('backfill', help='Run resumable, throttled data backfills.')
+
+
+def _postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def set_lock_timeout(timeout=LOCK_TIMEOUT):
+    """Makes the DDL that follows, in this transaction, give up after `timeout` waiting for a lock."""
+    if _postgresql():
+        op.execute(f"SET LOCAL lock_timeout = '{timeout}'")
+
+
+def add_nullable_column(table, column, lock_timeout=LOCK_TIMEOUT):
+    """Adds a column without rewriting or scanning the table."""
+    if not column.nullable:
+        raise ValueError(f'{table}.{column.name} must be added as nullable; tighten it with set_not_null()')
+    set_lock_timeout(lock_timeout)
+    op.add_column(table, column)
+
+
+def _index_state(name):
+    """None if the index does not exist, else whether it is valid."""
+    return op.get_bind().execute(text(
+        'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE c.relname = :name'), {'name': name}).scalar()
+
+
+def _partitions(table):
+    rows = op.get_bind().execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        "WHERE parent.relname = :table AND parent.relkind = 'p' ORDER BY 1"), {'table': table})
+    return [name for (name,) in rows]
+
+
+def _build_concurrently(name, table, columns, unique):
+    # A CONCURRENTLY build that failed half way leaves an INVALID index
+    # behind; drop it and start over so the migration can simply be re-run.
+    state = _index_state(name)
+    if state:
+        return
+    with op.get_context().autocommit_block():
+        if state is False:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {_quote(name)}')
+        op.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX CONCURRENTLY {_quote(name)} '
+                   f'ON {_quote(table)} ({", ".join(_quote(c) for c in columns)})')
+
+
+def create_index_concurrently(name, table, columns, unique=False):
+    """Builds an index while reads and writes on `table` continue.
+
+    CONCURRENTLY cannot run in a transaction, or on a partitioned table such
+    as "Show". For those the index is created on the parent only, built
+    concurrently on each partition and attached, after which PostgreSQL
+    marks the parent index valid.
+    """
+    if not _postgresql():
+        op.create_index(name, table, columns, unique=unique)
+        return
+    partitions = _partitions(table)
+    if not partitions:
+        _build_concurrently(name, table, columns, unique)
+        return
+    op.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {_quote(name)} '
+               f'ON ONLY {_quote(table)} ({", ".join(_quote(c) for c in columns)})')
+    for partition in partitions:
+        partition_index = f'{partition}_{"_".join(columns)}_idx'[:63]
+        _build_concurrently(partition_index, partition, columns, unique)
+        attached = op.get_bind().execute(text(
+            'SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:index AS regclass))'),
+            {'index': _quote(partition_index)}).scalar()
+        if not attached:
+            op.execute(f'ALTER INDEX {_quote(name)} ATTACH PARTITION {_quote(partition_index)}')
+
+
+def drop_index_concurrently(name, table):
+    if not _postgresql():
+        op.drop_index(name, table_name=table)
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {_quote(name)}')
+
+
+def _validate(table, constraint):
+    # VALIDATE scans the table under SHARE UPDATE EXCLUSIVE, which lets reads
+    # and writes continue; it runs outside the transaction that added the
+    # constraint so that transaction's stronger lock is already released.
+    with op.get_context().autocommit_block():
+        op.execute(f'ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(constraint)}')
+
+
+def set_not_null(table, column, lock_timeout=LOCK_TIMEOUT):
+    """Makes a backfilled column NOT NULL without a long exclusive lock.
+
+    SET NOT NULL on its own scans the whole table under ACCESS EXCLUSIVE.
+    Adding a NOT VALID check first and validating it separately lets
+    PostgreSQL (12+) skip that scan.
+    """
+    if not _postgresql():
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(column, nullable=False)
+        return
+    check = f'{table}_{column}_not_null'[:63]
+    set_lock_timeout(lock_timeout)
+    op.execute(f'ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(check)} '
+               f'CHECK ({_quote(column)} IS NOT NULL) NOT VALID')
+    _validate(table, check)
+    set_lock_timeout(lock_timeout)
+    op.execute(f'ALTER TABLE {_quote(table)} ALTER COLUMN {_quote(column)} SET NOT NULL')
+    op.execute(f'ALTER TABLE {_quote(table)} DROP CONSTRAINT {_quote(check)}')
+
+
+def add_foreign_key(name, source, referent, local_cols, remote_cols, lock_timeout=LOCK_TIMEOUT, **kw):
+    """Adds a foreign key, checking the existing rows without blocking writes."""
+    if not _postgresql():
+        with op.batch_alter_table(source) as batch:
+            batch.create_foreign_key(name, referent, local_cols, remote_cols, **kw)
+        return
+    set_lock_timeout(lock_timeout)
+    op.create_foreign_key(name, source, referent, local_cols, remote_cols, postgresql_not_valid=True, **kw)
+    _validate(source, name)
+
+
+# ----------------------------------------------------------------------------#
+# Backfills.
+# ----------------------------------------------------------------------------#
+
+# A backfill updates `table` one id range at a time: apply(connection, lo, hi)
+# handles the rows with lo < id <= hi and returns how many it changed. Each
+# batch commits together with its checkpoint, so an interrupted run resumes
+# after the last committed batch. Batch sizes adapt to keep each batch near
+# `target_seconds`, and the runner sleeps `pause` seconds between batches.
+
+Backfill = namedtuple('Backfill', 'name table apply')
+
+backfills = {}
+
+
+def register(name, table, apply):
+    backfills[name] = Backfill(name, table, apply)
+
+
+def sql_backfill(name, table, assignments, where=None):
+    """Registers a backfill that runs UPDATE "table" SET <assignments> [WHERE <where>]."""
+    condition = f' AND ({where})' if where else ''
+
+    def apply(connection, lo, hi):
+        return connection.execute(text(
+            f'UPDATE {_quote(table)} SET {assignments} WHERE id > :lo AND id <= :hi{condition}'),
+            {'lo': lo, 'hi': hi}).rowcount
+
+    register(name, table, apply)
+
+
+def run(backfill, batch_size=1000, pause=0.1, target_seconds=0.5, restart=False, progress=None):
+    """Runs `backfill` from its checkpoint to the highest id it started with."""
+    checkpoints = BackfillCheckpoint.__table__
+    by_name = checkpoints.c.name == backfill.name
+    with db.engine.begin() as connection:
+        checkpoint = connection.execute(select(checkpoints).where(by_name)).first()
+        if checkpoint is None or restart:
+            max_id = connection.execute(text(f'SELECT max(id) FROM {_quote(backfill.table)}')).scalar() or 0
+            connection.execute(delete(checkpoints).where(by_name))
+            connection.execute(insert(checkpoints).values(
+                name=backfill.name, last_id=0, max_id=max_id, rows=0, updated_at=datetime.utcnow()))
+            last_id, rows = 0, 0
+        elif checkpoint.finished_at is not None:
+            return checkpoint.rows
+        else:
+            last_id, max_id, rows = checkpoint.last_id, checkpoint.max_id, checkpoint.rows
+
+    max_batch = batch_size * 10
+    while last_id < max_id:
+        hi = min(last_id + batch_size, max_id)
+        started = time.monotonic()
+        with db.engine.begin() as connection:
+            rows += backfill.apply(connection, last_id, hi)
+            connection.execute(update(checkpoints).where(by_name).values(
+                last_id=hi, rows=rows, updated_at=datetime.utcnow()))
+        elapsed = time.monotonic() - started
+        last_id = hi
+        if progress:
+            progress(last_id, max_id, rows)
+        if elapsed > target_seconds * 2:
+            batch_size = max(batch_size // 2, 10)
+        elif elapsed < target_seconds / 2:
+            batch_size = min(batch_size * 2, max_batch)
+        time.sleep(pause)
+
+    with db.engine.begin() as connection:
+        connection.execute(update(checkpoints).where(by_name).values(finished_at=datetime.utcnow()))
+    return rows
+
+
+@cli.command('run')
+@click.argument('name')
+@click.option('--batch-size', default=1000, show_default=True, help='Ids per batch to start with.')
+@click.option('--pause', default=0.1, show_default=True, help='Seconds to sleep between batches.')
+@click.option('--target-seconds', default=0.5, show_default=True, help='Batch duration to adapt towards.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first id.')
+def run_command(name, batch_size, pause, target_seconds, restart):
+    """Run or resume the backfill NAME."""
+    if name not in backfills:
+        raise click.ClickException(f'Unknown backfill {name!r}; known: {", ".join(sorted(backfills)) or "none"}.')
+    reported = [0.0]
+
+    def progress(last_id, max_id, rows):
+        if time.monotonic() - reported[0] >= 5:
+            reported[0] = time.monotonic()
+            click.echo(f'{name}: id {last_id}/{max_id}, {rows} rows updated')
+
+    rows = run(backfills[name], batch_size, pause, target_seconds, restart, progress)
+    click.echo(f'{name}: done, {rows} rows updated')
+
+
+@cli.command('status')
+def status_command():
+    """Show the checkpoint of every backfill."""
+    for checkpoint in db.session.execute(select(BackfillCheckpoint).order_by(BackfillCheckpoint.name)).scalars():
+        state = f'finished {checkpoint.finished_at:%Y-%m-%d %H:%M}' if checkpoint.finished_at else 'in progress'
+        click.echo(f'{checkpoint.name}: id {checkpoint.last_id}/{checkpoint.max_id}, '
+                   f'{checkpoint.rows} rows, {state}')
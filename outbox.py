@@ -0,0 +1,277 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, select
+
+from extensions import db
+from models import Artist, OutboxConsumer, OutboxEvent, Show, Venue
+
+# ----------------------------------------------------------------------------#
+# Transactional outbox.
+# ----------------------------------------------------------------------------#
+
+# Every flush that inserts, updates or deletes a Venue, Artist or Show also
+# writes an OutboxEvent row on the same connection, so the change and its
+# event commit or roll back together and request handlers need no extra
+# calls (update_versioned, which bypasses the flush, writes its own).
+#
+# `flask outbox consume` reads events after the consumer's offset in id
+# order and hands each to the handlers registered for its entity, advancing
+# the offset only past events every handler accepted. A handler that raises
+# stops the batch and the event is retried next time, so delivery is at
+# least once and handlers must be idempotent.
+#
+# Ids are assigned at insert but become visible at commit, so a transaction
+# can commit after a later id has already been read. The consumer therefore
+# stops at a gap in the ids until it is older than OUTBOX_GAP_SECONDS, by
+# which time the missing id has either committed or rolled back.
+#
+# State held in each process's memory (the name and duplicate indexes, the
+# page cache) is kept current by @follower handlers instead: every web
+# process applies every event itself, from its own position in memory, in
+# follow(). That runs before a request at most every OUTBOX_FOLLOW_INTERVAL
+# seconds, and before the next request after this process committed a
+# change, so a writer reads its own writes and the other workers catch up
+# within the interval. Process settings changed at runtime (see
+# logger.broadcast_level) travel the same way, as events that are not row
+# changes, written with record().
+
+TRACKED = (Venue, Artist, Show)
+
+cli = AppGroup('outbox', help='Deliver and prune change events.')
+
+_handlers = defaultdict(list)   # entity name, or '*' -> [handler(event)]
+_followers = defaultdict(list)  # entity name, or '*' -> [handler(event)]
+
+
+def _registrar(registry, entities):
+    def register(function):
+        for entity in entities or ('*',):
+            registry[entity].append(function)
+        return function
+    return register
+
+
+def handler(*entities):
+    """Registers a function `flask outbox consume` calls with each OutboxEvent for `entities` (default: all)."""
+    return _registrar(_handlers, entities)
+
+
+def follower(*entities):
+    """Registers a function every web process calls with each OutboxEvent for `entities` (default: all)."""
+    return _registrar(_followers, entities)
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _event(obj, action, attrs):
+    return {
+        'entity': obj.__tablename__,
+        'entity_id': obj.id,
+        'action': action,
+        'data': {attr.key: _jsonable(attr.value) for attr in attrs},
+        'created_at': datetime.utcnow(),
+    }
+
+
+def record(entity, action, entity_id=0, **data):
+    """Adds an event to the current transaction for a change that is not a tracked row's."""
+    db.session.execute(insert(OutboxEvent).values(
+        entity=entity, entity_id=entity_id, action=action, data=data, created_at=datetime.utcnow()))
+    db.session.info['outbox'] = True
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_changes(session, flush_context):
+    # new/dirty/deleted and attribute history still describe this flush here
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, TRACKED):
+            state = inspect(obj)
+            rows.append(_event(obj, 'insert', [state.attrs[c.key] for c in state.mapper.column_attrs]))
+    for obj in session.dirty:
+        if isinstance(obj, TRACKED):
+            state = inspect(obj)
+            changed = [state.attrs[c.key] for c in state.mapper.column_attrs
+                       if state.attrs[c.key].history.has_changes()]
+            if changed:
+                rows.append(_event(obj, 'update', changed))
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED):
+            state = inspect(obj)
+            rows.append(_event(obj, 'delete', [state.attrs[c.key] for c in state.mapper.column_attrs]))
+    if rows:
+        session.connection().execute(insert(OutboxEvent.__table__), rows)
+        session.info['outbox'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _committed(session):
+    if session.info.pop('outbox', False):
+        _position.behind = True
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('outbox', None)
+
+
+def _in_order(events, last_id, gap_seconds):
+    """`events` (after `last_id`, by id) up to the first gap that may still fill."""
+    settled = datetime.utcnow() - timedelta(seconds=gap_seconds)
+    for outbox_event in events:
+        if outbox_event.id != last_id + 1 and outbox_event.created_at > settled:
+            return  # an earlier id may still be in flight
+        yield outbox_event
+        last_id = outbox_event.id
+
+
+def consume(name='default', batch_size=500, gap_seconds=None):
+    """Delivers the next batch of events to consumer `name`; returns how many."""
+    if gap_seconds is None:
+        gap_seconds = current_app.config['OUTBOX_GAP_SECONDS']
+    if not any(_handlers.values()):
+        return 0  # nothing to deliver to; keep the events for when there is
+    offset = db.session.execute(
+        select(OutboxConsumer).where(OutboxConsumer.name == name).with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if offset is None:
+        if db.session.get(OutboxConsumer, name) is not None:
+            db.session.rollback()
+            return 0  # another process is consuming as `name`
+        offset = OutboxConsumer(name=name, last_id=0, updated_at=datetime.utcnow())
+        db.session.add(offset)
+        db.session.flush()
+
+    events = db.session.execute(
+        select(OutboxEvent).where(OutboxEvent.id > offset.last_id).order_by(OutboxEvent.id).limit(batch_size)
+    ).scalars().all()
+    delivered = 0
+    last_id = offset.last_id
+    try:
+        for outbox_event in _in_order(events, last_id, gap_seconds):
+            for function in _handlers[outbox_event.entity] + _handlers['*']:
+                function(outbox_event)
+            last_id = outbox_event.id
+            delivered += 1
+    finally:
+        offset.last_id = last_id
+        offset.updated_at = datetime.utcnow()
+        db.session.commit()
+    return delivered
+
+
+class Position:
+    """How far this process's @follower handlers have got.
+
+    Module state rather than per pid: a worker forked after preload
+    inherits the indexes built there together with the position they match.
+    """
+
+    def __init__(self):
+        self.last_id = None  # None until the first follow()
+        self.behind = False  # this process committed events it has not applied
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def due(self, interval):
+        return self.behind or time.monotonic() - self.checked_at >= interval
+
+
+_position = Position()
+
+
+def follow(batch_size=500, gap_seconds=None):
+    """Applies events committed since this process last looked to the @follower handlers.
+
+    The first call only records the newest event id: state loaded from the
+    tables after that point already reflects the earlier events.
+    """
+    if gap_seconds is None:
+        gap_seconds = current_app.config['OUTBOX_GAP_SECONDS']
+    if not _position.lock.acquire(blocking=False):
+        return  # another thread of this process is at it
+    try:
+        _position.behind = False
+        _position.checked_at = time.monotonic()
+        if _position.last_id is None:
+            _position.last_id = db.session.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+            return
+        while True:
+            events = db.session.execute(
+                select(OutboxEvent).where(OutboxEvent.id > _position.last_id)
+                .order_by(OutboxEvent.id).limit(batch_size)
+            ).scalars().all()
+            for outbox_event in _in_order(events, _position.last_id, gap_seconds):
+                for function in _followers[outbox_event.entity] + _followers['*']:
+                    try:
+                        function(outbox_event)
+                    except Exception:
+                        # one bad event must not wedge every process; it is skipped here
+                        current_app.logger.exception('outbox follower failed', extra={'event_id': outbox_event.id})
+                _position.last_id = outbox_event.id
+            if len(events) < batch_size or _position.last_id != events[-1].id:
+                return
+    finally:
+        _position.lock.release()
+
+
+def prune(older_than_days):
+    """Deletes events every consumer has seen that are older than `older_than_days`."""
+    seen = db.session.execute(select(func.min(OutboxConsumer.last_id))).scalar() or 0
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = db.session.execute(
+        delete(OutboxEvent).where(OutboxEvent.id <= seen, OutboxEvent.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+@cli.command('consume')
+@click.option('--name', default='default', show_default=True, help='Consumer whose offset to advance.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--interval', default=1.0, show_default=True, help='Seconds to wait when idle.')
+@click.option('--once', is_flag=True, help='Deliver what is pending, then exit.')
+def consume_command(name, batch_size, interval, once):
+    """Deliver change events to the registered handlers."""
+    while True:
+        try:
+            delivered = consume(name, batch_size)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('outbox handler failed')
+            delivered = 0
+        if once and delivered < batch_size:
+            break
+        if delivered < batch_size:
+            time.sleep(interval)
+
+
+@cli.command('prune')
+@click.option('--older-than-days', default=7, show_default=True)
+def prune_command(older_than_days):
+    """Delete delivered events."""
+    click.echo(f'deleted {prune(older_than_days)} events')
+
+
+def init_app(app):
+    if app.config.get('SNAPSHOT_PATH'):
+        return  # a snapshot has no outbox and takes no writes
+    app.extensions['outbox'] = _position
+
+    @app.before_request
+    def _follow():
+        if _position.due(app.config['OUTBOX_FOLLOW_INTERVAL']):
+            follow()
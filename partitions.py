@@ -0,0 +1,165 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import gzip
+import os
+import re
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from extensions import db
+
+# ----------------------------------------------------------------------------#
+# Show partitions.
+# ----------------------------------------------------------------------------#
+
+# On PostgreSQL "Show" is range-partitioned by month on start_time (see
+# migration 53cd44864ed4). Each month lives in "Show_pYYYY_MM"; rows outside
+# every month land in "Show_default". `flask partitions maintain` keeps
+# partitions created ahead of time and moves months older than the retention
+# window out of "Show", so queries on start_time only visit the active window.
+#
+# Archived months are no longer part of "Show": their shows drop out of the
+# venue and artist pages' past shows and of /shows. The analytics rollups
+# keep counting them. `flask partitions restore YYYY-MM` attaches a month
+# kept in the archive schema again.
+
+PARENT = 'Show'
+ARCHIVE_SCHEMA = 'show_archive'
+_PARTITION_NAME = re.compile(r'^Show_p(\d{4})_(\d{2})$')
+
+cli = AppGroup('partitions', help='Maintain the monthly partitions of the Show table.')
+
+
+def month_start(value, offset=0):
+    """First day of the month `offset` months away from `value`'s month."""
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_p{month.year:04d}_{month.month:02d}'
+
+
+def create_partition_sql(month):
+    return (f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{PARENT}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')")
+
+
+def attached_partitions(connection):
+    """Months currently attached to "Show", oldest first."""
+    rows = connection.execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = :parent'), {'parent': PARENT})
+    months = []
+    for (name,) in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_future_partitions(connection, ahead, today=None):
+    """Makes sure this month and the next `ahead` months have a partition."""
+    this_month = month_start(today or datetime.now())
+    created = []
+    existing = set(attached_partitions(connection))
+    for offset in range(ahead + 1):
+        month = month_start(this_month, offset)
+        if month not in existing:
+            _create_partition(connection, month)
+            created.append(partition_name(month))
+    return created
+
+
+def _create_partition(connection, month):
+    # Shows booked beyond the prepared months sit in the default partition,
+    # and PostgreSQL refuses to create a partition whose range still has rows
+    # there. Move those rows across while the default partition is detached.
+    bounds = {'start': month, 'end': month_start(month, 1)}
+    in_range = 'start_time >= :start AND start_time < :end'
+    stranded = connection.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM "{PARENT}_default" WHERE {in_range})'), bounds).scalar()
+    if not stranded:
+        connection.execute(text(create_partition_sql(month)))
+        return
+    connection.execute(text(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{PARENT}_default"'))
+    connection.execute(text(create_partition_sql(month)))
+    connection.execute(text(f'INSERT INTO "{PARENT}" SELECT * FROM "{PARENT}_default" WHERE {in_range}'), bounds)
+    connection.execute(text(f'DELETE FROM "{PARENT}_default" WHERE {in_range}'), bounds)
+    connection.execute(text(f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{PARENT}_default" DEFAULT'))
+
+
+def _export(connection, name, export_dir):
+    """Copies a detached partition to a gzipped CSV file and drops it."""
+    path = os.path.join(export_dir, f'{name}.csv.gz')
+    raw = connection.connection.cursor()
+    with gzip.open(path, 'wb') as out:
+        raw.copy_expert(f'COPY "{ARCHIVE_SCHEMA}"."{name}" TO STDOUT WITH (FORMAT csv, HEADER)', out)
+    connection.execute(text(f'DROP TABLE "{ARCHIVE_SCHEMA}"."{name}"'))
+    return path
+
+
+def archive_old_partitions(connection, retain, export_dir=None, today=None):
+    """Detaches months older than `retain` months into the archive schema.
+
+    With `export_dir` the detached months are written out as gzipped CSV and
+    dropped from the database instead.
+    """
+    cutoff = month_start(today or datetime.now(), -retain)
+    connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"'))
+    archived = []
+    for month in attached_partitions(connection):
+        if month >= cutoff:
+            break
+        name = partition_name(month)
+        connection.execute(text(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}"'))
+        connection.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"'))
+        archived.append(_export(connection, name, export_dir) if export_dir else f'{ARCHIVE_SCHEMA}.{name}')
+    return archived
+
+
+@cli.command('maintain')
+@click.option('--ahead', default=3, show_default=True, help='Months of future partitions to keep ready.')
+@click.option('--retain', default=24, show_default=True,
+              help='Months of past shows to keep attached; older ones leave the venue and artist pages.')
+@click.option('--export-dir', type=click.Path(file_okay=False, writable=True),
+              help='Write archived months here as .csv.gz and drop them from the database.')
+def maintain(ahead, retain, export_dir):
+    """Create upcoming partitions and archive the ones past retention."""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Show partitioning requires PostgreSQL.')
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+    with db.engine.begin() as connection:
+        for name in create_future_partitions(connection, ahead):
+            click.echo(f'created {name}')
+        for name in archive_old_partitions(connection, retain, export_dir):
+            click.echo(f'archived {name}')
+
+
+@cli.command('restore')
+@click.argument('month', type=click.DateTime(formats=['%Y-%m']))
+def restore(month):
+    """Attach an archived month (YYYY-MM) to "Show" again."""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Show partitioning requires PostgreSQL.')
+    month = month_start(month)
+    name = partition_name(month)
+    with db.engine.begin() as connection:
+        archived = connection.execute(text(
+            'SELECT EXISTS (SELECT 1 FROM pg_tables WHERE schemaname = :schema AND tablename = :name)'),
+            {'schema': ARCHIVE_SCHEMA, 'name': name}).scalar()
+        if not archived:
+            raise click.ClickException(f'{ARCHIVE_SCHEMA}.{name} does not exist (exported months must be re-imported).')
+        connection.execute(text(f'ALTER TABLE "{ARCHIVE_SCHEMA}"."{name}" SET SCHEMA public'))
+        connection.execute(text(
+            f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"))
+    click.echo(f'restored {name}')
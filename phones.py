@@ -0,0 +1,79 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlalchemy import and_, bindparam, select, update
+
+from models import Artist, Venue
+
+# ----------------------------------------------------------------------------#
+# Phone numbers.
+# ----------------------------------------------------------------------------#
+
+# Phones are kept as entered in `phone`, for display, and as E.164
+# ("+14155550123") in the indexed `phone_e164`, which the write handlers fill
+# in through normalize() and lookups compare against. Numbers without a
+# country code are read as DEFAULT_REGION ones.
+#
+# Parsing is memoised: a form's validator and its handler, or an import
+# repeating the same numbers, parse each distinct string once per process.
+# Rows written before `phone_e164` existed are filled in by
+# `flask backfill run venue_phone_e164` / `artist_phone_e164`.
+
+DEFAULT_REGION = 'US'
+
+Parsed = namedtuple('Parsed', 'raw e164')
+
+BACKFILLS = {'venue_phone_e164': Venue, 'artist_phone_e164': Artist}
+
+# digits and phone punctuation only
+_PHONE_LIKE = re.compile(r'^\+?[\d\s().\-/]*$')
+
+
+@lru_cache(maxsize=8192)
+def normalize(raw, region=DEFAULT_REGION):
+    """`raw` in E.164, or None if it is not a valid phone number."""
+    if not raw or len(raw) > 64:
+        return None
+    # phonenumbers loads large metadata tables; only pay for it once a phone is parsed.
+    import phonenumbers
+    try:
+        number = phonenumbers.parse(raw, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def validate_many(values, region=DEFAULT_REGION):
+    """Parsed(raw, e164) for each of `values`, e164 None where invalid; for bulk imports."""
+    return [Parsed(raw, normalize(raw, region)) for raw in values]
+
+
+def looks_like_phone(value):
+    """Whether a search term is worth parsing as a phone number."""
+    return bool(_PHONE_LIKE.match(value or '')) and sum(c.isdigit() for c in value) >= 7
+
+
+def backfill(model):
+    """An online_migrations backfill apply() that fills in model.phone_e164."""
+    table = model.__table__
+    set_e164 = (update(table).where(table.c.id == bindparam('row_id'))
+                .values(phone_e164=bindparam('e164')))
+
+    def apply(connection, lo, hi):
+        rows = connection.execute(
+            select(table.c.id, table.c.phone)
+            .where(and_(table.c.id > lo, table.c.id <= hi,
+                        table.c.phone_e164.is_(None), table.c.phone.isnot(None))))
+        changes = [{'row_id': id, 'e164': e164} for id, phone in rows for e164 in (normalize(phone),) if e164]
+        if changes:
+            connection.execute(set_e164, changes)
+        return len(changes)
+
+    return apply
@@ -0,0 +1,170 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import gzip
+import multiprocessing
+import os
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+import coalesce
+import outbox
+from extensions import db
+from models import Artist, Show, Venue
+
+# ----------------------------------------------------------------------------#
+# Static pre-rendering.
+# ----------------------------------------------------------------------------#
+
+# With PRERENDER_DIR set, every /venues/<id> and /artists/<id> page is kept
+# on disk as venues/<id>.html and artists/<id>.html, each with a .html.gz
+# sibling, so a front proxy can answer GETs for them directly, e.g. nginx:
+#
+#   location ~ ^/(venues|artists)/\d+$ {
+#       root <PRERENDER_DIR>; gzip_static on;
+#       try_files $uri.html @app;
+#   }
+#
+# `flask outbox consume`, run next to the web processes, re-renders the
+# pages each committed change affects (see outbox.py). Pages also change as
+# upcoming shows become past ones, so `flask prerender` should run
+# periodically as well.
+
+_executors = {}  # pid -> ThreadPoolExecutor, so a forked worker gets its own
+
+
+def _write(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for target, data in ((path, body), (path + '.gz', gzip.compress(body, 9))):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+
+
+def _remove(path):
+    for target in (path, path + '.gz'):
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
+
+
+def render(app, kind, id):
+    """Renders /<kind>/<id> through the app and stores it, or drops it if gone."""
+    path = os.path.join(app.config['PRERENDER_DIR'], kind, f'{id}.html')
+    # straight from the database: the file outlives any cached copy of the page
+    response = app.test_client().get(f'/{kind}/{id}', environ_overrides={coalesce.BYPASS: True})
+    if response.status_code == 200:
+        _write(path, response.get_data())
+    else:
+        _remove(path)
+    return response.status_code
+
+
+def _related(venue_ids, artist_ids):
+    """Pages that list the given venues/artists through their shows."""
+    artists, venues = set(), set()
+    if venue_ids:
+        artists.update(db.session.execute(
+            select(Show.artist_id).where(Show.venue_id.in_(venue_ids)).distinct()).scalars())
+    if artist_ids:
+        venues.update(db.session.execute(
+            select(Show.venue_id).where(Show.artist_id.in_(artist_ids)).distinct()).scalars())
+    return venues - {None}, artists - {None}
+
+
+def _refresh(app, venue_ids, artist_ids, cascade):
+    if cascade:
+        with app.app_context():
+            related_venues, related_artists = _related(venue_ids, artist_ids)
+            db.session.remove()
+        venue_ids, artist_ids = venue_ids | related_venues, artist_ids | related_artists
+    for id in venue_ids:
+        render(app, 'venues', id)
+    for id in artist_ids:
+        render(app, 'artists', id)
+
+
+def refresh(venues=(), artists=(), cascade=True):
+    """Re-renders the given pages.
+
+    With `cascade`, the pages of artists that played the venues and of
+    venues the artists played are refreshed too, since they show those
+    names and images. The pages are rendered on another thread, whose
+    requests get their own database session instead of ending the caller's.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('PRERENDER_DIR'):
+        return
+    executor = _executors.get(os.getpid())
+    if executor is None:
+        executor = _executors[os.getpid()] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prerender')
+    executor.submit(_refresh, app, set(venues), set(artists), cascade).result()
+
+
+@outbox.handler('Venue', 'Artist', 'Show')
+def _rerender(event):
+    if event.entity == 'Venue':
+        # a new venue has no shows yet, so no other page mentions it
+        refresh(venues=[event.entity_id], cascade=event.action != 'insert')
+    elif event.entity == 'Artist':
+        refresh(artists=[event.entity_id], cascade=event.action != 'insert')
+    else:
+        show = event.data
+        if 'venue_id' not in show or 'artist_id' not in show:
+            # an update only carries the changed columns
+            show = db.session.execute(select(Show.venue_id, Show.artist_id)
+                                      .where(Show.id == event.entity_id)).mappings().first() or {}
+        refresh(venues={show.get('venue_id')} - {None}, artists={show.get('artist_id')} - {None}, cascade=False)
+
+
+# ----------------------------------------------------------------------------#
+# Full rebuild.
+# ----------------------------------------------------------------------------#
+
+_worker_app = None
+
+
+def _init_worker(config):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config)
+
+
+def _render_batch(kind, ids):
+    return [render(_worker_app, kind, id) for id in ids]
+
+
+@click.command('prerender')
+@click.option('--processes', default=os.cpu_count(), show_default=True, help='Worker processes.')
+@click.option('--batch', default=200, show_default=True, help='Pages per task.')
+@with_appcontext
+def prerender_command(processes, batch):
+    """Render every venue and artist page into PRERENDER_DIR."""
+    app = current_app._get_current_object()
+    if not app.config.get('PRERENDER_DIR'):
+        raise click.ClickException('Set PRERENDER_DIR to enable pre-rendering.')
+    tasks = []
+    for kind, model in (('venues', Venue), ('artists', Artist)):
+        ids = db.session.execute(select(model.id).order_by(model.id)).scalars().all()
+        tasks += [(kind, ids[i:i + batch]) for i in range(0, len(ids), batch)]
+    db.session.remove()
+
+    # Spawned, not forked: each process builds its own app and engine from
+    # this app's settings instead of inheriting open connections.
+    config = types.SimpleNamespace(**{k: v for k, v in app.config.items() if k.isupper()})
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(config,)) as pool:
+        for statuses in pool.map(_render_batch, [kind for kind, _ in tasks], [ids for _, ids in tasks]):
+            rendered += sum(status == 200 for status in statuses)
+    click.echo(f'rendered {rendered} pages into {app.config["PRERENDER_DIR"]}')
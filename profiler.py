@@ -0,0 +1,202 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from flask import current_app, request
+
+# ----------------------------------------------------------------------------#
+# Sampling profiler.
+# ----------------------------------------------------------------------------#
+
+# With PROFILE_ENABLED, a daemon thread in each process wakes every
+# PROFILE_INTERVAL seconds and records the Python stack of every thread that
+# is serving a request, counted per (endpoint, stack). Nothing is hooked
+# into the code being profiled, so the cost is one sys._current_frames()
+# walk per tick, independent of the request rate.
+#
+# The counts only ever grow; /debug/profile?seconds=N reports the samples
+# taken during the next N seconds as collapsed stacks (one
+# "endpoint;frame;...;frame count" line per stack, the input of
+# flamegraph.pl and speedscope) or as speedscope JSON with one profile per
+# endpoint.
+#
+# Only OS threads are visible to sys._current_frames(), so under a gevent
+# worker the stacks of waiting greenlets are not sampled.
+
+# the profile request itself, and streams that mostly sit idle
+IGNORED_ENDPOINTS = {'debug.profile', 'events.stream'}
+
+TRUNCATED = ('(other stacks)', '', 0)
+
+
+class Sampler:
+
+    def __init__(self, interval, max_depth, max_stacks):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self._counts = Counter()  # (endpoint, ((name, file, line), ...) root first) -> samples
+        self._active = {}         # thread ident -> endpoint being served
+        self._labels = {}         # code object -> (name, file, line)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name='profiler', daemon=True).start()
+
+    def enter(self, endpoint):
+        self._active[threading.get_ident()] = endpoint
+
+    def leave(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+        return label
+
+    def sample(self):
+        frames = sys._current_frames()
+        taken = []
+        for ident, endpoint in list(self._active.items()):
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                taken.append((endpoint, tuple(reversed(stack))))
+        with self._lock:
+            for key in taken:
+                if key not in self._counts and len(self._counts) >= self.max_stacks:
+                    key = (key[0], (TRUNCATED,))
+                self._counts[key] += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:
+                pass  # a thread exiting mid-walk; the next tick will do
+
+    def counts(self):
+        with self._lock:
+            return Counter(self._counts)
+
+
+def sampler(app=None):
+    """This process's sampler, started on first use so forked workers get their own."""
+    app = app or current_app._get_current_object()
+    samplers = app.extensions['profiler']
+    instance = samplers.get(os.getpid())
+    if instance is None:
+        instance = samplers[os.getpid()] = Sampler(
+            app.config['PROFILE_INTERVAL'], app.config['PROFILE_MAX_DEPTH'], app.config['PROFILE_MAX_STACKS'])
+    return instance
+
+
+def record(seconds, endpoint=None):
+    """Samples taken during the next `seconds`, optionally for one endpoint only."""
+    instance = sampler()
+    before = instance.counts()
+    time.sleep(seconds)
+    samples = instance.counts()
+    samples.subtract(before)
+    return Counter({key: count for key, count in samples.items()
+                    if count > 0 and (endpoint is None or key[0] == endpoint)})
+
+
+def _frame_name(label):
+    name, filename, line = label
+    return f'{name} ({os.path.basename(filename)}:{line})' if filename else name
+
+
+def collapsed(samples):
+    lines = []
+    for (endpoint, stack), count in sorted(samples.items(), key=lambda item: -item[1]):
+        frames = ';'.join([endpoint] + [_frame_name(label).replace(';', ':') for label in stack])
+        lines.append(f'{frames} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def speedscope(samples, interval):
+    frames, index = [], {}
+    profiles = {}
+    for (endpoint, stack), count in samples.items():
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                name, filename, line = label
+                frames.append({'name': name, 'file': filename, 'line': line})
+            ids.append(index[label])
+        profile = profiles.setdefault(endpoint, {'samples': [], 'weights': []})
+        profile['samples'].append(ids)
+        profile['weights'].append(count * interval)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': 'fyyur',
+        'exporter': 'fyyur profiler',
+        'shared': {'frames': frames},
+        'profiles': [
+            {'type': 'sampled', 'name': endpoint, 'unit': 'seconds', 'startValue': 0,
+             'endValue': sum(profile['weights']), 'samples': profile['samples'], 'weights': profile['weights']}
+            for endpoint, profile in sorted(profiles.items())
+        ],
+    }
+
+
+class Busy(Exception):
+    """A memory_diff() window is already open in this process."""
+
+
+_memory_window = threading.Lock()
+
+
+def memory_diff(seconds, limit=50):
+    """The allocation sites whose live memory changed most over the next `seconds`.
+
+    Tracing is switched on for the window if it was off; it slows every
+    allocation while it runs. One window at a time per process, since
+    tracing is process-wide and one window's stop() would end another's;
+    raises Busy while one is open.
+    """
+    if not _memory_window.acquire(blocking=False):
+        raise Busy()
+    try:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(25)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+    finally:
+        _memory_window.release()
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno')
+    return [str(stat) for stat in stats[:limit]]
+
+
+def init_app(app):
+    app.extensions['profiler'] = {}  # pid -> Sampler
+    if not app.config.get('PROFILE_ENABLED'):
+        return
+
+    @app.before_request
+    def _enter():
+        if request.endpoint not in IGNORED_ENDPOINTS:
+            sampler(app).enter(request.endpoint or '(no endpoint)')
+
+    @app.teardown_request
+    def _leave(exc):
+        sampler(app).leave()
@@ -0,0 +1,71 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+from collections import namedtuple
+from itertools import groupby
+
+from sqlalchemy import func, or_, select
+
+import phones
+from extensions import db
+from models import Artist, Show, Venue
+
+# ----------------------------------------------------------------------------#
+# Read models.
+# ----------------------------------------------------------------------------#
+
+# Listing and search pages only display a few columns, so they read through
+# column-projected Core queries into named tuples rather than hydrating full
+# ORM objects (no identity map, no per-instance state tracking).
+
+NameRow = namedtuple('NameRow', ['id', 'name'])
+VenueListRow = namedtuple('VenueListRow', ['id', 'name', 'city', 'state', 'num_upcoming_shows'])
+
+
+def _rows(row_type, stmt):
+    return [row_type._make(row) for row in db.session.execute(stmt)]
+
+
+def artist_names():
+    stmt = select(Artist.id, Artist.name).order_by(Artist.id)
+    return _rows(NameRow, stmt)
+
+
+def _matches(model, search_term):
+    # a term that reads as a phone number also matches on the indexed phone_e164
+    matches = model.name.ilike(f"%{search_term}%")
+    e164 = phones.normalize(search_term.strip()) if phones.looks_like_phone(search_term) else None
+    return or_(matches, model.phone_e164 == e164) if e164 else matches
+
+
+def search_artist_names(search_term):
+    stmt = (select(Artist.id, Artist.name)
+            .where(_matches(Artist, search_term))
+            .order_by(Artist.id))
+    return _rows(NameRow, stmt)
+
+
+def search_venue_names(search_term):
+    stmt = (select(Venue.id, Venue.name)
+            .where(_matches(Venue, search_term))
+            .order_by(Venue.id))
+    return _rows(NameRow, stmt)
+
+
+def venue_listing():
+    """One row per venue with its upcoming show count, ordered by area."""
+    num_upcoming_shows = func.count(Show.id).filter(Show.is_upcoming())
+    stmt = (select(Venue.id, Venue.name, Venue.city, Venue.state, num_upcoming_shows)
+            .outerjoin(Show, Show.venue_id == Venue.id)
+            .group_by(Venue.id)
+            .order_by(Venue.state, Venue.city, Venue.id))
+    return _rows(VenueListRow, stmt)
+
+
+def venue_areas():
+    """Venues grouped by city and state, as rendered by pages/venues.html."""
+    return [
+        {'city': city, 'state': state, 'venues': list(venues)}
+        for (state, city), venues in groupby(venue_listing(), key=lambda row: (row.state, row.city))
+    ]
@@ -0,0 +1,207 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import fcntl
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from extensions import db
+from models import Artist, Show, Venue
+
+# ----------------------------------------------------------------------------#
+# Sitemaps.
+# ----------------------------------------------------------------------------#
+
+# /sitemap.xml lists one gzipped shard per SITEMAP_SHARD_SIZE ids of venues
+# and of artists (venues-0000.xml.gz, ...), each listing the detail pages in
+# its id range, so crawlers reach every page without walking the listings.
+#
+# Generation streams (id, version_id) of each kind through a server-side
+# cursor, merged with per-page show counts, and never loads a table. Next to
+# each shard, a manifest keeps a fingerprint and lastmod per page; a shard
+# is only rewritten when a fingerprint in it changed, and a page's lastmod
+# only moves when its own fingerprint did. A fingerprint changes when the
+# record is edited or a show is added to or removed from it (not when an
+# upcoming show becomes a past one).
+#
+# `flask sitemap`, e.g. from cron, regenerates the files. A request that finds
+# the index older than SITEMAP_MAX_AGE starts a regeneration on a background
+# thread (one per process; a file lock keeps it to one across workers) and is
+# served the old files meanwhile. URLs are always built from
+# SITEMAP_BASE_URL, never from the request's Host header; without it the
+# sitemaps are not served at all.
+
+KINDS = {'venues': (Venue, Show.venue_id), 'artists': (Artist, Show.artist_id)}
+
+INDEX = 'sitemap.xml'
+
+_STREAM = {'stream_results': True}
+
+_refreshing = threading.Lock()
+
+
+def _lastmod(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def _replace(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    try:
+        with open(path) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def fingerprints(kind):
+    """Yields (id, fingerprint) for every venue or artist, in id order."""
+    model, foreign_key = KINDS[kind]
+    records = db.session.execute(select(model.id, model.version_id).order_by(model.id),
+                                 execution_options=_STREAM)
+    shows = iter(db.session.execute(
+        select(foreign_key, func.count(Show.id), func.max(Show.id))
+        .where(foreign_key.isnot(None)).group_by(foreign_key).order_by(foreign_key),
+        execution_options=_STREAM))
+    show = next(shows, None)
+    for id, version_id in records:
+        while show is not None and show[0] < id:
+            show = next(shows, None)
+        count, last = (show[1], show[2]) if show is not None and show[0] == id else (0, None)
+        yield id, f'{version_id}:{count}:{last}'
+
+
+def _write_shard(directory, base_url, kind, shard, pages, now, force):
+    """Brings one shard up to date; returns (file name, lastmod)."""
+    name = f'{kind}-{shard:04d}.xml.gz'
+    manifest_path = os.path.join(directory, f'{kind}-{shard:04d}.json')
+    previous = _load(manifest_path)
+    if force or previous is None or previous['base_url'] != base_url:
+        previous = {'base_url': base_url, 'lastmod': now, 'pages': {}}
+    old_pages = previous['pages']
+    pages = {str(id): [fingerprint, old_pages[str(id)][1]]
+             if str(id) in old_pages and old_pages[str(id)][0] == fingerprint else [fingerprint, now]
+             for id, fingerprint in pages}
+    if pages == old_pages and os.path.exists(os.path.join(directory, name)):
+        return name, previous['lastmod']
+
+    body = io.BytesIO()
+    with gzip.GzipFile(fileobj=body, mode='wb', mtime=0) as out:
+        out.write(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                  b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for id, (_, lastmod) in pages.items():
+            out.write(f'<url><loc>{escape(f"{base_url}/{kind}/{id}")}</loc>'
+                      f'<lastmod>{_lastmod(lastmod)}</lastmod></url>\n'.encode())
+        out.write(b'</urlset>\n')
+    _replace(os.path.join(directory, name), body.getvalue())
+    _replace(manifest_path, json.dumps({'base_url': base_url, 'lastmod': now, 'pages': pages}).encode())
+    return name, now
+
+
+def generate(directory, base_url, shard_size, force=False):
+    """Regenerates the changed shards and the index; returns the shard names."""
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    shards = []
+    for kind in KINDS:
+        shard, pages = None, []
+        for id, fingerprint in fingerprints(kind):
+            if (id - 1) // shard_size != shard:
+                if pages:
+                    shards.append(_write_shard(directory, base_url, kind, shard, pages, now, force))
+                shard, pages = (id - 1) // shard_size, []
+            pages.append((id, fingerprint))
+        if pages:
+            shards.append(_write_shard(directory, base_url, kind, shard, pages, now, force))
+
+    # shards whose id range is now empty
+    current = {name for name, _ in shards}
+    for entry in os.listdir(directory):
+        stem = entry.partition('.')[0]
+        if stem.split('-')[0] in KINDS and f'{stem}.xml.gz' not in current:
+            os.remove(os.path.join(directory, entry))
+
+    index = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for name, lastmod in shards:
+        index.append(f'<sitemap><loc>{escape(f"{base_url}/sitemaps/{name}")}</loc>'
+                     f'<lastmod>{_lastmod(lastmod)}</lastmod></sitemap>\n')
+    index.append('</sitemapindex>\n')
+    _replace(os.path.join(directory, INDEX), ''.join(index).encode())
+    return [name for name, _ in shards]
+
+
+def age(app=None):
+    """Seconds since the index was written, or None if there is none."""
+    app = app or current_app
+    try:
+        return time.time() - os.path.getmtime(os.path.join(app.config['SITEMAP_DIR'], INDEX))
+    except FileNotFoundError:
+        return None
+
+
+def _refresh(app, base_url):
+    directory = app.config['SITEMAP_DIR']
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            try:
+                # another worker is already on it
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            current = age(app)
+            if current is None or current >= app.config['SITEMAP_MAX_AGE']:
+                with app.app_context():
+                    try:
+                        generate(directory, base_url, app.config['SITEMAP_SHARD_SIZE'])
+                    finally:
+                        db.session.remove()
+    except Exception:
+        app.logger.exception('sitemap regeneration failed')
+    finally:
+        _refreshing.release()
+
+
+def refresh_in_background(base_url, app=None):
+    """Starts regenerating the sitemaps if the index is missing or older than SITEMAP_MAX_AGE."""
+    app = app or current_app._get_current_object()
+    current = age(app)
+    if current is not None and current < app.config['SITEMAP_MAX_AGE']:
+        return
+    if not _refreshing.acquire(blocking=False):
+        return
+    threading.Thread(target=_refresh, args=(app, base_url), name='sitemap', daemon=True).start()
+
+
+@click.command('sitemap')
+@click.option('--base-url', help='Site root used in the URLs (default: SITEMAP_BASE_URL).')
+@click.option('--force', is_flag=True, help='Rewrite every shard and reset every lastmod.')
+@with_appcontext
+def sitemap_command(base_url, force):
+    """Regenerate the sitemap index and its changed shards."""
+    base_url = (base_url or current_app.config['SITEMAP_BASE_URL'] or '').rstrip('/')
+    if not base_url:
+        raise click.UsageError('Set SITEMAP_BASE_URL or pass --base-url.')
+    shards = generate(current_app.config['SITEMAP_DIR'], base_url,
+                      current_app.config['SITEMAP_SHARD_SIZE'], force)
+    click.echo(f'{len(shards)} sitemap shards in {current_app.config["SITEMAP_DIR"]}')
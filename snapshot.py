@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import os
+import sqlite3
+from functools import partial
+
+import click
+from flask import abort, request
+from flask.cli import with_appcontext
+from sqlalchemy import Index, MetaData, create_engine, insert, select
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable
+
+from extensions import db
+from models import (Artist, ArtistMonthlyShows, GenreCityMonthlyShows, Show, Venue,
+                    VenueMonthlyShows)
+
+# ----------------------------------------------------------------------------#
+# Read-only SQLite snapshots.
+# ----------------------------------------------------------------------------#
+
+# `flask snapshot OUT` copies everything the GET views read into a single
+# SQLite file, indexed for those views. An edge node started with
+# SNAPSHOT_PATH pointing at such a file serves every page from it through
+# the same models, with no database server and no network hop, and turns
+# away writes.
+#
+# The file is opened immutable (no locking, no journal) and memory-mapped.
+# To publish a newer snapshot, copy it next to the old one and rename it
+# over it: connections opened afterwards, at the latest after
+# SNAPSHOT_RECYCLE seconds, read the new file.
+
+TABLES = (Venue, Artist, Show, VenueMonthlyShows, ArtistMonthlyShows, GenreCityMonthlyShows)
+
+# beyond the models' own indexes; venue_listing() orders by area
+EXTRA_INDEXES = {
+    'Venue': [('ix_Venue_state_city', ('state', 'city', 'id'))],
+    'Show': [('ix_Show_start_time', ('start_time',))],
+}
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# search forms POST but only read
+READ_ENDPOINTS = {'venues.search_venues', 'artists.search_artists'}
+
+
+def _connect(path, mmap_bytes):
+    connection = sqlite3.connect(f'file:{path}?immutable=1', uri=True, check_same_thread=False)
+    connection.execute(f'PRAGMA mmap_size = {int(mmap_bytes)}')
+    connection.execute('PRAGMA query_only = 1')
+    return connection
+
+
+def configure(app):
+    """Points the app at SNAPSHOT_PATH, if set; call before db.init_app()."""
+    path = app.config.get('SNAPSHOT_PATH')
+    if not path:
+        return
+    path = os.path.abspath(path)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'creator': partial(_connect, path, app.config['SNAPSHOT_MMAP_BYTES']),
+        'poolclass': QueuePool,
+        'pool_recycle': app.config['SNAPSHOT_RECYCLE'],
+    }
+
+    @app.before_request
+    def _read_only():
+        if request.method not in READ_METHODS and request.endpoint not in READ_ENDPOINTS:
+            abort(503, 'This node serves a read-only snapshot.')
+
+
+def export(path, batch_size=5000):
+    """Writes the snapshot to `path`, replacing any file there atomically."""
+    path = os.path.abspath(path)
+    partial_path = f'{path}.{os.getpid()}.partial'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    metadata = MetaData()
+    tables = [model.__table__.to_metadata(metadata) for model in TABLES]
+    for table in tables:
+        for name, columns in EXTRA_INDEXES.get(table.name, ()):
+            Index(name, *(table.c[column] for column in columns))
+
+    target = create_engine(f'sqlite:///{partial_path}')
+    counts = {}
+    try:
+        with db.engine.connect() as source, target.begin() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode = OFF')
+            connection.exec_driver_sql('PRAGMA synchronous = OFF')
+            for model, table in zip(TABLES, tables):
+                connection.execute(CreateTable(table))
+                rows = source.execution_options(stream_results=True).execute(
+                    select(model.__table__).order_by(*model.__table__.primary_key.columns))
+                counts[table.name] = 0
+                for batch in rows.mappings().partitions(batch_size):
+                    connection.execute(insert(table), [dict(row) for row in batch])
+                    counts[table.name] += len(batch)
+                # building the indexes after the load is much cheaper than maintaining them
+                for index in table.indexes:
+                    index.create(connection)
+            connection.exec_driver_sql('ANALYZE')
+        with target.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode = DELETE')
+            connection.exec_driver_sql('VACUUM')
+    except BaseException:
+        target.dispose()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    target.dispose()
+    os.replace(partial_path, path)
+    return counts
+
+
+@click.command('snapshot')
+@click.argument('out', type=click.Path(dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows copied per INSERT.')
+@with_appcontext
+def snapshot_command(out, batch_size):
+    """Export a read-only SQLite snapshot for edge read nodes to OUT."""
+    counts = export(out, batch_size)
+    for table, count in counts.items():
+        click.echo(f'{table}: {count} rows')
+    click.echo(f'wrote {out} ({os.path.getsize(out) // 1024} KiB)')
@@ -0,0 +1 @@
+# Blueprints for the venue, artist and show pages, registered by create_app().
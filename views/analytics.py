@@ -0,0 +1,24 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, jsonify, render_template, request
+
+import analytics
+
+bp = Blueprint('analytics', __name__)
+
+#  Analytics
+#  ----------------------------------------------------------------
+
+def _months():
+  return max(1, min(request.args.get('months', 12, type=int), 120))
+
+@bp.route('/analytics')
+def dashboard():
+  # read from the rollup tables only, never from Show
+  return render_template('pages/analytics.html', analytics=analytics.summary(_months()))
+
+@bp.route('/api/analytics')
+def api():
+  return jsonify(analytics.summary(_months()))
@@ -0,0 +1,207 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, current_app, render_template, request, flash, redirect, url_for
+from sqlalchemy.orm.exc import StaleDataError
+
+import coalesce
+import dedupe
+import events
+import phones
+import read_models
+from extensions import db
+from forms import ArtistForm
+from loaders import loader
+from models import Artist, Venue, update_versioned
+
+bp = Blueprint('artists', __name__)
+
+#  Artists
+#  ----------------------------------------------------------------
+@bp.route('/artists')
+def artists():
+  return render_template('pages/artists.html', artists=read_models.artist_names())
+
+@bp.route('/artists/search', methods=['POST'])
+def search_artists():
+  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+  # search for "band" should return "The Wild Sax Band".
+  search_term = request.form['search_term']
+  artists = read_models.search_artist_names(search_term)
+
+  results = {}
+  results['count'] = len(artists)
+  results['data'] = artists
+
+  current_app.logger.debug('artist search', extra={'search_term': search_term, 'count': results['count']})
+  return render_template('pages/search_artists.html', results=results, search_term=request.form.get('search_term', ''))
+
+def artist_page(artist_id):
+  # the template data of /artists/<artist_id>, or None if there is no such artist
+  artists = Artist.query.get(artist_id)
+  if artists is None:
+    return None
+
+  # queried separately so each side only touches its own Show partitions
+  past_shows = []
+  upcoming_shows = []
+  for shows, found in ((past_shows, artists.past_shows()), (upcoming_shows, artists.upcoming_shows())):
+    for show in found:
+      venue = loader(Venue).load(show.venue_id)
+      if venue:
+        shows.append({
+          'venue_id': show.venue_id,
+          'venue_name': venue.name,
+          'venue_image_link': venue.image_link,
+          'start_time': show.start_time
+        })
+
+  current_app.logger.debug('artist shows', extra={'artist_id': artists.id, 'count': len(past_shows) + len(upcoming_shows)})
+
+  return {
+    "id": artists.id,
+    "name": artists.name,
+    "genres": artists.genres,
+    "city": artists.city,
+    "state": artists.state,
+    "phone": artists.phone,
+    "website_link": artists.website_link,
+    "facebook_link": artists.facebook_link,
+    "seeking_description": artists.seeking_description,
+    "image_link": artists.image_link,
+    'past_shows': past_shows,
+    'upcoming_shows': upcoming_shows,
+    'past_shows_count': len(past_shows),
+    'upcoming_shows_count': len(upcoming_shows)
+  }
+
+@bp.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  # concurrent requests for the same artist share one computation
+  data = coalesce.cached(lambda: artist_page(artist_id), artist_id)
+  if data is None:
+    flash("Artist does not exist.")
+    abort(404)
+  return render_template('pages/show_artist.html', artist=data)
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  artists = Artist.query.get(artist_id)
+  if artists is None:
+    abort(404)
+  # the form carries the record's version_id back to the edit submission
+  form = ArtistForm(obj=artists)
+  artist = {
+    'id': artists.id,
+    'name': artists.name
+  }
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # TODO: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  error = False
+  form_submited = ArtistForm(request.form)
+  if  not form_submited.validate():
+    flash('An error occured in your input !')
+    current = Artist.query.get(artist_id)
+    if current is None:
+      abort(404)
+    # the heading names the record as stored, not as typed
+    artist = {
+      'id': current.id,
+      'name': current.name
+    }
+    return render_template('forms/edit_artist.html', form=form_submited, artist=artist)
+  try:
+    # one UPDATE, applied only if nobody changed the artist since the form was loaded
+    version_id = update_versioned(Artist, artist_id, form_submited.version_id.data, {
+      'name': request.form['name'],
+      'city': request.form['city'],
+      'state': request.form['state'],
+      'phone': request.form['phone'],
+      'phone_e164': phones.normalize(request.form['phone']),
+      'facebook_link': request.form['facebook_link'],
+      'image_link': request.form['image_link'],
+      'website_link': request.form['website_link'],
+    })
+    if version_id is None:
+      flash('Artist does not exist.')
+    else:
+      events.publish('artist', 'updated', id=artist_id, version_id=version_id,
+                     name=request.form['name'], image_link=request.form['image_link'])
+      db.session.commit()
+      flash('Artist' + request.form['name'] + 'was successfully edited')
+  except StaleDataError:
+    db.session.rollback()
+    flash('Artist ' + request.form['name'] + ' was changed by someone else while you were editing it. '
+          'Your changes were not saved; please review the current details and try again.')
+    return redirect(url_for('artists.edit_artist', artist_id=artist_id))
+  except:
+    current_app.logger.exception('artist edit failed')
+    error = True
+    flash('An error occurred. Artist'+ request.form['name'] + 'could not be edited.')
+    db.session.rollback()
+  finally:
+    db.session.close()
+
+  return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  # TODO: insert form data as a new Venue record in the db, instead
+  error = False
+  # if form.validate():
+  #   flash('The form was filed succesfully')
+  # else:
+  #   flash('An error occured, Bad Input,Try again')
+  #   return render_template('forms/new_artist.html', form=form)
+  try:
+    name = request.form['name']
+    genres = request.form.getlist('genres')
+    city = request.form['city']
+    state = request.form['state']
+    phone = request.form['phone']
+    image_link = request.form['image_link']
+    website_link = request.form['website_link']
+    facebook_link = request.form['facebook_link']
+    seeking_venue = request.form.get('seeking_venue')
+    seeking_venue = True if seeking_venue else False
+
+    # near-duplicates are flagged, not refused: the match may be a different act
+    duplicates = dedupe.index.matches(dedupe.record('artists', name=name, city=city, state=state, phone=phone))
+    artists = Artist(name=name, genres=genres, city=city, state=state, phone=phone,
+                     phone_e164=phones.normalize(phone), image_link=image_link,
+                     website_link=website_link, facebook_link=facebook_link, seeking_venue=seeking_venue)
+    db.session.add(artists)
+    db.session.commit()
+    if duplicates:
+      flash('Artist ' + name + ' may duplicate: ' + ', '.join(f'{match.name} (#{match.id})' for match in duplicates))
+    # on successful db insert, flash success
+    flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  except:
+    current_app.logger.exception('artist create failed')
+    error = True
+    # TODO: on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
+    flash('Artist' + request.form['name'] + 'could not be listed.')
+    db.session.rollback()
+  finally:
+    db.session.close()
+  # TODO: modify data to be the data object returned from db insertion
+  return render_template('pages/home.html')
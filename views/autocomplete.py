@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, jsonify, request
+
+from name_index import index
+
+bp = Blueprint('autocomplete', __name__)
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@bp.route('/autocomplete')
+def autocomplete():
+  # answered from the in-memory name index, without a database round trip
+  limit = min(request.args.get('limit', 10, type=int), 50)
+  return jsonify(index.search(request.args.get('q', ''), limit=limit))
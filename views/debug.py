@@ -0,0 +1,73 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hmac
+from functools import wraps
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+
+import logger
+import profiler
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+#  Access
+#  ----------------------------------------------------------------
+
+def require_debug_token(view):
+  # Debug endpoints only exist when DEBUG_TOKEN is configured, and then
+  # require it as a bearer token.
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    token = current_app.config.get('DEBUG_TOKEN')
+    if not token:
+      abort(404)
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not hmac.compare_digest(supplied.encode(), token.encode()):
+      abort(401)
+    return view(*args, **kwargs)
+  return wrapper
+
+#  Logging
+#  ----------------------------------------------------------------
+
+@bp.route('/log-level', methods=['PUT'])
+@require_debug_token
+def set_log_level():
+  # changes the level here at once and in the other workers within OUTBOX_FOLLOW_INTERVAL
+  body = request.get_json(silent=True) or {}
+  try:
+    level = logger.broadcast_level(current_app, str(body.get('level', '')).upper(), body.get('logger'))
+  except ValueError:
+    abort(400)
+  return jsonify({'logger': body.get('logger') or current_app.logger.name, 'level': level})
+
+#  Profiling
+#  ----------------------------------------------------------------
+
+@bp.route('/profile')
+@require_debug_token
+def profile():
+  # Samples this worker for ?seconds=N (default 10) and returns the stacks as
+  # ?format=collapsed (default) or speedscope, optionally for one ?endpoint=.
+  # ?memory=1 returns a tracemalloc diff over the window instead.
+  seconds = request.args.get('seconds', 10, type=float)
+  if not 0 < seconds <= current_app.config['PROFILE_MAX_SECONDS']:
+    abort(400)
+  if request.args.get('memory', type=int):
+    try:
+      lines = profiler.memory_diff(seconds)
+    except profiler.Busy:
+      abort(409, 'A memory profile is already running in this worker.')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+
+  format = request.args.get('format', 'collapsed')
+  if format not in ('collapsed', 'speedscope'):
+    abort(400)
+  if not current_app.config.get('PROFILE_ENABLED'):
+    abort(409, 'The sampling profiler is disabled (PROFILE_ENABLED).')
+  samples = profiler.record(seconds, request.args.get('endpoint'))
+  if format == 'speedscope':
+    return jsonify(profiler.speedscope(samples, current_app.config['PROFILE_INTERVAL']))
+  return Response(profiler.collapsed(samples), mimetype='text/plain')
@@ -0,0 +1,25 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, Response, current_app, request
+
+import events
+
+bp = Blueprint('events', __name__)
+
+#  Events
+#  ----------------------------------------------------------------
+
+@bp.route('/events')
+def stream():
+  # ?topics=show,venue limits the stream to those kinds of deltas
+  topics = {topic for topic in request.args.get('topics', '').split(',') if topic} or None
+  broker = events.broker()
+  try:
+    subscription = broker.subscribe(topics, request.headers.get('Last-Event-ID'))
+  except events.Full:
+    return 'Service Unavailable', 503, {'Retry-After': '5'}
+  return Response(events.stream(broker, subscription, current_app.config['EVENTS_HEARTBEAT']),
+                  mimetype='text/event-stream',
+                  headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, current_app, make_response, redirect, request
+
+import images
+from extensions import db
+from images import ImageError
+from models import Artist, Venue
+
+bp = Blueprint('images', __name__)
+
+KINDS = {'venues': Venue, 'artists': Artist}
+
+#  Thumbnails
+#  ----------------------------------------------------------------
+
+@bp.route('/img/<kind>/<int:id>/<size>')
+def thumbnail(kind, id, size):
+  if kind not in KINDS or size not in current_app.config['IMAGE_SIZES']:
+    abort(404)
+  image_link = db.session.query(KINDS[kind].image_link).filter_by(id=id).scalar()
+  if not image_link:
+    abort(404)
+
+  try:
+    import PIL  # noqa: F401
+  except ImportError:
+    return redirect(image_link)
+
+  format = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+  try:
+    key, data = images.thumbnail(image_link, size, format)
+  except ImageError:
+    current_app.logger.warning('thumbnail failed', exc_info=True)
+    return redirect(image_link)
+
+  # a versioned URL only ever names this image_link, so it never changes
+  versioned = request.args.get('v') == images.link_version(image_link)
+  response = make_response(data)
+  response.mimetype = images.FORMATS[format]
+  response.set_etag(key)
+  response.vary.add('Accept')
+  response.cache_control.public = True
+  response.cache_control.max_age = 31536000 if versioned else 300
+  response.cache_control.immutable = versioned
+  return response.make_conditional(request)
@@ -0,0 +1,89 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, current_app, render_template, request, flash
+
+import analytics
+import coalesce
+import events
+from extensions import db
+from forms import ShowForm
+from loaders import loader
+from models import Artist, Venue, Show
+
+bp = Blueprint('shows', __name__)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def show_listing():
+  data = []
+  shows = Show.query.all()
+  for show in shows:
+    # the first lookups fetch the venues and artists of every show in one query each
+    venue = loader(Venue).load(show.venue_id)
+    artist = loader(Artist).load(show.artist_id)
+    show_data = {
+      'venue_id': show.venue_id,
+      'venue_name': venue.name,
+      'artist_id': show.artist_id,
+      'artist_name': artist.name,
+      'artist_image_link': artist.image_link,
+      'start_time': str(show.start_time)
+    }
+    data.append(show_data)
+  current_app.logger.debug('show listing', extra={'count': len(data)})
+  return data
+
+@bp.route('/shows')
+def shows():
+  # displays list of shows at /shows
+  # TODO: replace with real venues data.
+  return render_template('pages/shows.html', shows=coalesce.cached(show_listing))
+
+@bp.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db, upon submitting new show listing form
+  # TODO: insert form data as a new Show record in the db, instead
+
+  error = False
+  try:
+    import dateutil.parser
+
+    artist_id = request.form['artist_id']
+    venue_id = request.form['venue_id']
+    start_time = dateutil.parser.parse(request.form['start_time'])
+    artist = Artist.query.get(artist_id)
+    venue = Venue.query.get(venue_id)
+    if artist is None or venue is None:
+      raise LookupError(f'unknown artist {artist_id} or venue {venue_id}')
+    shows = Show(artist_id=artist.id, venue_id=venue.id, start_time=start_time)
+
+    db.session.add(shows)
+    # rollup counters are bumped in the same transaction as the show
+    analytics.record_show(start_time, venue, artist)
+    db.session.flush()
+    events.publish('show', 'created', id=shows.id, start_time=start_time,
+                   venue_id=venue.id, venue_name=venue.name,
+                   artist_id=artist.id, artist_name=artist.name, artist_image_link=artist.image_link)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Show was successfully listed!')
+  except:
+    current_app.logger.exception('show create failed')
+    error= True
+    flash('An error occured. Show could not be listed.')
+    db.session.rollback()
+  # TODO: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Show could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
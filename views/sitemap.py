@@ -0,0 +1,32 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, current_app, send_from_directory
+
+bp = Blueprint('sitemap', __name__)
+
+#  Sitemaps
+#  ----------------------------------------------------------------
+
+@bp.route('/sitemap.xml')
+def index():
+  # the URLs must not come from the Host header, so no base URL means no sitemap
+  base_url = (current_app.config['SITEMAP_BASE_URL'] or '').rstrip('/')
+  if not base_url:
+    abort(404)
+  # crawlers are the only callers; load the generator on their first visit
+  import sitemap
+  sitemap.refresh_in_background(base_url)
+  if sitemap.age() is None:
+    # the first index is still being generated
+    return 'Service Unavailable', 503, {'Retry-After': '60'}
+  return send_from_directory(current_app.config['SITEMAP_DIR'], sitemap.INDEX,
+                             mimetype='application/xml', max_age=current_app.config['SITEMAP_MAX_AGE'])
+
+@bp.route('/sitemaps/<name>')
+def shard(name):
+  if not current_app.config['SITEMAP_BASE_URL'] or not name.endswith('.xml.gz'):
+    abort(404)
+  return send_from_directory(current_app.config['SITEMAP_DIR'], name,
+                             mimetype='application/gzip', max_age=current_app.config['SITEMAP_MAX_AGE'])
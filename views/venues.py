@@ -0,0 +1,231 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, current_app, render_template, request, flash, redirect, url_for
+from sqlalchemy.orm.exc import StaleDataError
+
+import coalesce
+import dedupe
+import events
+import phones
+import read_models
+from extensions import db
+from forms import VenueForm
+from models import Venue, update_versioned
+
+bp = Blueprint('venues', __name__)
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+def venues():
+  # venues grouped by city/state, each with its number of upcoming shows
+  return render_template('pages/venues.html', areas=coalesce.cached(read_models.venue_areas))
+
+@bp.route('/venues/search', methods=['POST'])
+def search_venues():
+  # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
+  # seach for Hop should return "The Musical Hop".
+  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+  # get search term
+  search_term = request.form['search_term']
+
+  # retrive venues matching search term
+  venues = read_models.search_venue_names(search_term)
+  results = {}
+  results['count'] = len(venues)
+  results['data'] = venues
+  current_app.logger.debug('venue search', extra={'search_term': search_term, 'count': results['count']})
+  return render_template('pages/search_venues.html', results=results, search_term=request.form.get('search_term', ''))
+
+def venue_page(venue_id):
+  # the template data of /venues/<venue_id>, or None if there is no such venue
+  venue = Venue.query.get(venue_id)
+  if venue is None:
+    return None
+
+  # retrieve show data
+  upcoming_shows = venue.upcoming_shows()
+  past_shows = venue.past_shows()
+
+  return {
+    'id': venue.id,
+    'name': venue.name,
+    'genres': venue.genres,
+    'address': venue.address,
+    'city': venue.city,
+    'state': venue.state,
+    'phone': venue.phone,
+    'website_link': venue.website_link,
+    'facebook_link': venue.facebook_link,
+    'seeking_talent': venue.seeking_talent,
+    'seeking_description': venue.seeking_description,
+    'image_link': venue.image_link,
+    'past_shows': [show.to_json() for show in past_shows],
+    'upcoming_shows': [show.to_json() for show in upcoming_shows],
+    'past_shows_count': len(past_shows),
+    'upcoming_shows_count': len(upcoming_shows)
+  }
+
+@bp.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  # concurrent requests for the same venue share one computation
+  data = coalesce.cached(lambda: venue_page(venue_id), venue_id)
+  if data is None:
+    flash("Error occured: Invalid ID reference.")
+    current_app.logger.info('unknown venue', extra={'venue_id': venue_id})
+    abort(404)
+  return render_template('pages/show_venue.html', venue=data)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  # TODO: insert form data as a new Venue record in the db, instead
+  # TODO: modify data to be the data object returned from db insertion
+
+  # on successful db insert, flash success
+  # TODO: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+  error = False
+  form = VenueForm(request.form)
+  if form.validate():
+    flash('The form was filed succesfully created')
+  # else:
+  #   flash('An error occured, Check below')
+  #   return render_template('forms/new_venue.html', form=form)
+  try:
+    name = request.form['name']
+    genres = request.form.getlist('genres')
+    city = request.form['city']
+    state = request.form['state']
+    address = request.form['address']
+    phone = request.form['phone']
+    website_link = request.form['website_link']
+    image_link = request.form['image_link']
+    facebook_link = request.form['facebook_link']
+    seeking_talent = request.form.get('seeking_talent')
+    seeking_talent = True if seeking_talent else False
+    seeking_description = request.form['seeking_description']
+
+    # near-duplicates are flagged, not refused: the match may be a different venue
+    duplicates = dedupe.index.matches(dedupe.record('venues', name=name, city=city, state=state,
+                                                    phone=phone, address=address))
+    venue = Venue(name=name, genres=genres, city=city, state=state, address=address, phone=phone,
+                  phone_e164=phones.normalize(phone),
+                  website_link=website_link, image_link=image_link, facebook_link=facebook_link,
+                  seeking_talent=seeking_talent, seeking_description=seeking_description)
+    db.session.add(venue)
+    db.session.commit()
+    if duplicates:
+      flash('Venue ' + name + ' may duplicate: ' + ', '.join(f'{match.name} (#{match.id})' for match in duplicates))
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    current_app.logger.exception('venue create failed')
+    error = True
+    flash('An error occured.' + request.form['name'] + 'could not be listed.')
+    db.session.rollback()
+  finally:
+    db.session.close()
+
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  return render_template('pages/home.html')
+
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # TODO: Complete this endpoint for taking a venue_id, and using
+  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  try:
+    venue = Venue.query.get(venue_id)
+    db.session.delete(venue)
+    events.publish('venue', 'deleted', id=venue.id)
+    db.session.commit()
+    flash('Venue' + venue.name + 'was successfully deleted!')
+  except:
+    current_app.logger.exception('venue delete failed')
+    db.session.rollback()
+    flash('An error has occurred,' + venue.name + 'could not be deleted.')
+  finally:
+    db.session.close()
+
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+  # clicking that button delete it from the db then redirect the user to the homepage
+  return None
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  venues = Venue.query.get(venue_id)
+  if venues is None:
+    abort(404)
+  # the form carries the record's version_id back to the edit submission
+  form = VenueForm(obj=venues)
+  venue = {
+    'id': venues.id,
+    'name': venues.name
+  }
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  # TODO: take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+  error = False
+  form_submited = VenueForm(request.form)
+  if not form_submited.validate():
+    flash('An error occured in your input !')
+    current = Venue.query.get(venue_id)
+    if current is None:
+      abort(404)
+    # the heading names the record as stored, not as typed
+    venue = {
+      'id': current.id,
+      'name': current.name
+    }
+    return render_template('forms/edit_venue.html', form=form_submited, venue=venue)
+
+  try:
+    # one UPDATE, applied only if nobody changed the venue since the form was loaded
+    version_id = update_versioned(Venue, venue_id, form_submited.version_id.data, {
+      'name': request.form['name'],
+      'genres': request.form.getlist('genres'),
+      'city': request.form['city'],
+      'state': request.form['state'],
+      'address': request.form['address'],
+      'phone': request.form['phone'],
+      'phone_e164': phones.normalize(request.form['phone']),
+      'website_link': request.form['website_link'],
+      'image_link': request.form['image_link'],
+      'facebook_link': request.form['facebook_link'],
+    })
+    if version_id is None:
+      flash('Venue does not exist.')
+    else:
+      events.publish('venue', 'updated', id=venue_id, version_id=version_id,
+                     name=request.form['name'], image_link=request.form['image_link'])
+      db.session.commit()
+      flash('Venue' + request.form['name'] + 'was successfully edited!')
+  except StaleDataError:
+    db.session.rollback()
+    flash('Venue ' + request.form['name'] + ' was changed by someone else while you were editing it. '
+          'Your changes were not saved; please review the current details and try again.')
+    return redirect(url_for('venues.edit_venue', venue_id=venue_id))
+  except:
+    current_app.logger.exception('venue edit failed')
+    error =True
+    flash('An error occured. Venue' + request.form['name'] + 'could not be edited.')
+    db.session.rollback()
+  finally:
+    db.session.close()
+
+  return redirect(url_for('venues.show_venue', venue_id=venue_id))
@@ -0,0 +1,68 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+
+import importlib
+
+from sqlalchemy.orm import configure_mappers
+
+import dedupe
+import forms
+import outbox
+from app import create_app
+from extensions import db
+from name_index import index as name_index
+
+# ----------------------------------------------------------------------------#
+# Production entry point.
+# ----------------------------------------------------------------------------#
+
+# `gunicorn -c gunicorn.conf.py` imports this module once in the master
+# process and forks the workers from it (see gunicorn.conf.py). Everything
+# preload() touches is then shared copy-on-write by every worker instead of
+# being rebuilt in each one.
+
+# Imported lazily by the request path; loading them here puts them in the
+# shared pages. Missing optional ones are skipped.
+WARM_MODULES = ('babel.dates', 'dateutil.parser', 'phonenumbers', 'PIL.Image')
+
+
+def preload(app):
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    # resolve the model relationships up front rather than on the first query
+    configure_mappers()
+
+    # compile every template into the environment's cache
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+    # WTForms binds a form class's fields on its first instantiation
+    with app.test_request_context():
+        for form in (forms.ShowForm, forms.VenueForm, forms.ArtistForm):
+            form(meta={'csrf': False})
+
+    # the autocomplete and duplicate indexes, built once for every worker to
+    # inherit; the outbox position is taken first, so no change made
+    # meanwhile is missed
+    with app.app_context():
+        try:
+            if 'outbox' in app.extensions:
+                outbox.follow()
+            name_index.load()
+            dedupe.index.load()
+        except Exception:
+            app.logger.exception('indexes not built at startup; loading them on first use')
+        db.session.remove()
+
+    # no connection may be shared with the workers
+    db.get_engine(app).dispose()
+
+
+app = create_app()
+preload(app)